@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BatchResult:
+    """ID指定の一括取得結果"""
+
+    def __init__(self, ids):
+        self.ids = list(ids)  # 入力順（重複を含む）
+        self.items = {}       # ID -> 取得したオブジェクト
+        self.errors = {}      # ID -> 失敗理由
+
+    def ordered(self):
+        """入力順に並べた結果（失敗したIDはNone）"""
+        return [self.items.get(item_id) for item_id in self.ids]
+
+    @property
+    def ok(self):
+        """すべて取得できたかどうか"""
+        return not self.errors
+
+
+class BatchFetcher:
+    """任意件数のIDをページに分割し、並列に取得して入力順にまとめるクラス
+
+    重複したIDは1回だけ問い合わせ、失敗はIDごとに BatchResult.errors に記録する。
+    ワーカーからのリクエストは呼び出し元スレッドと同じ優先度で送られる。
+    """
+
+    def __init__(self, client, max_workers=4):
+        self.client = client
+        self.max_workers = max_workers
+
+    def fetch(self, endpoint, ids, response_key, page_size=50):
+        """endpoint?ids=... をページ単位で呼び出して結果をまとめる"""
+        result = BatchResult(ids)
+        unique_ids = list(dict.fromkeys(item_id for item_id in result.ids if item_id))
+        if not unique_ids:
+            return result
+
+        pages = [unique_ids[i:i + page_size] for i in range(0, len(unique_ids), page_size)]
+        priority = self.client.scheduler.current_priority()
+
+        def fetch_page(page):
+            with self.client.scheduler.priority(priority):
+                return self.client._make_request('GET', endpoint, params={'ids': ','.join(page)})
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pages))) as executor:
+            futures = [executor.submit(fetch_page, page) for page in pages]
+            for page, future in zip(pages, futures):
+                try:
+                    body = future.result()
+                except Exception as e:
+                    body = None
+                    print(f"一括取得エラー: {e}")
+
+                if not body:
+                    for item_id in page:
+                        result.errors[item_id] = "リクエストに失敗しました"
+                    continue
+
+                # レスポンスはリクエストしたIDと同じ順で、見つからないものは null になる
+                objects = body.get(response_key) or []
+                for index, item_id in enumerate(page):
+                    obj = objects[index] if index < len(objects) else None
+                    if obj is None:
+                        result.errors[item_id] = "見つかりませんでした"
+                    else:
+                        result.items[item_id] = obj
+
+        return result
@@ -1,16 +1,22 @@
 # emotion_song_manager.py
 import random
+from itertools import combinations
 from typing import List, Dict, Optional
-from song import Song
+from song import Song, intern_song
+from song_table import SongTable
+from placeholder_renderer import placeholder_url
 
 
 class EmotionSongManager:
     """感情に基づいたおすすめ楽曲を管理するクラス"""
     
+    # ページごとに目標値をずらす量（推薦APIは offset を持たないので、条件を変えて別の楽曲を得る）
+    PAGE_TARGET_SHIFTS = (0.0, -0.05, 0.05, -0.1, 0.1)
+    
     def __init__(self, spotify_client):
         self.spotify_client = spotify_client
         self.emotion_mappings = self._initialize_emotion_mappings()
-        self.current_emotion_songs = []
+        self.current_emotion_songs = SongTable()
         self.current_index = 0
     
     def _initialize_emotion_mappings(self) -> Dict[str, Dict]:
@@ -108,107 +114,126 @@ class EmotionSongManager:
     
     def generate_songs_for_emotion(self, emotion: str, limit: int = 10) -> List[Song]:
         """指定された感情に基づいて楽曲を生成"""
+        return self.generate_songs_page(emotion, limit) or []
+    
+    def generate_songs_page(self, emotion: str, limit: int = 10, page: int = 0) -> Optional[List[Song]]:
+        """指定された感情の楽曲を1ページ分生成（page を進めると検索結果の続きから取得）
+        
+        すべての取得元でリクエストに失敗した場合は None を返す（該当する楽曲がない場合は空のリスト）。
+        """
         if not self.spotify_client.is_authenticated():
-            return self._get_fallback_songs(emotion, limit)
+            # フォールバック楽曲は固定なので最初のページだけ
+            return self._get_fallback_songs(emotion, limit) if page == 0 else []
         
         if emotion not in self.emotion_mappings:
             return []
         
         emotion_config = self.emotion_mappings[emotion]
+        per_source = max(1, limit // 3)
         
-        # 複数の手法で楽曲を取得
-        songs = []
-        
-        # 1. ユーザーのトップトラックベースの推薦
-        top_tracks_songs = self._get_songs_from_user_top_tracks(emotion_config, limit // 3)
-        songs.extend(top_tracks_songs)
+        # 複数の手法で楽曲を取得（失敗した手法は None、どの手法も page ごとに別の条件で取得する）
+        results = [
+            # 1. ユーザーのトップトラックベースの推薦
+            self._get_songs_from_user_top_tracks(emotion_config, per_source, page),
+            # 2. ジャンルベースの推薦
+            self._get_songs_from_genres(emotion_config, per_source, page),
+            # 3. 一般的な検索ベースの推薦
+            self._get_songs_from_search(emotion, per_source, page),
+        ]
+        if all(result is None for result in results):
+            return None
+        songs = [song for result in results if result for song in result]
         
-        # 2. ジャンルベースの推薦
-        genre_songs = self._get_songs_from_genres(emotion_config, limit // 3)
-        songs.extend(genre_songs)
-        
-        # 3. 一般的な検索ベースの推薦
-        search_songs = self._get_songs_from_search(emotion, limit // 3)
-        songs.extend(search_songs)
-        
-        # 重複を除去し、指定された数に調整
-        unique_songs = []
-        seen_ids = set()
-        
-        for song in songs:
-            if song.spotify_id not in seen_ids:
-                unique_songs.append(song)
-                seen_ids.add(song.spotify_id)
-                if len(unique_songs) >= limit:
-                    break
+        # 重複を除去し、指定された数に調整（Song は同じ曲なら同じハッシュになる）
+        unique_songs = list(dict.fromkeys(songs))[:limit]
         
         # 足りない場合は追加で取得
         if len(unique_songs) < limit:
-            additional_songs = self._get_additional_songs(emotion_config, limit - len(unique_songs), seen_ids)
+            additional_songs = self._get_additional_songs(emotion_config, limit - len(unique_songs), set(unique_songs), page)
             unique_songs.extend(additional_songs)
         
         return unique_songs[:limit]
     
-    def _get_songs_from_user_top_tracks(self, emotion_config: Dict, limit: int) -> List[Song]:
-        """ユーザーのトップトラックを基にした推薦"""
+    def _get_songs_from_user_top_tracks(self, emotion_config: Dict, limit: int, page: int = 0) -> Optional[List[Song]]:
+        """ユーザーのトップトラックを基にした推薦（取得に失敗した場合はNone）"""
         try:
             # ユーザーのトップトラックを取得
-            top_tracks = self.spotify_client.get_user_top_tracks(limit=5)
-            if not top_tracks or not top_tracks.get('items'):
+            top_tracks = self.spotify_client.get_user_top_tracks(limit=20)
+            if top_tracks is None:
+                return None
+            items = top_tracks.get('items') or []
+            if not items:
                 return []
             
-            # トップトラックのIDを取得
-            seed_tracks = [track['id'] for track in top_tracks['items'][:2]]
+            # トップトラックのIDを取得（ページごとに2曲ずつずらす）
+            start = page * 2
+            seed_tracks = [items[(start + i) % len(items)]['id'] for i in range(min(2, len(items)))]
             
             # 推薦を取得
             recommendations = self.spotify_client.get_recommendations(
                 seed_tracks=seed_tracks,
                 limit=limit,
-                **self._get_audio_features_params(emotion_config)
+                **self._get_audio_features_params(emotion_config, page=page)
             )
             
-            if recommendations and recommendations.get('tracks'):
+            if recommendations is None:
+                return None
+            if recommendations.get('tracks'):
                 return [self._create_song_from_track(track) for track in recommendations['tracks']]
             
         except Exception as e:
             print(f"ユーザートップトラックベース推薦でエラー: {e}")
+            return None
         
         return []
     
-    def _get_songs_from_genres(self, emotion_config: Dict, limit: int) -> List[Song]:
-        """ジャンルベースの推薦"""
+    def _get_songs_from_genres(self, emotion_config: Dict, limit: int, page: int = 0) -> Optional[List[Song]]:
+        """ジャンルベースの推薦（取得に失敗した場合はNone）"""
         try:
             genres = emotion_config.get('genres', [])
             if not genres:
                 return []
             
-            # ランダムにジャンルを選択
-            selected_genres = random.sample(genres, min(2, len(genres)))
+            if page == 0:
+                # ランダムにジャンルを選択
+                selected_genres = random.sample(genres, min(2, len(genres)))
+            else:
+                # 続きのページはジャンルの組み合わせを順番に使う
+                pairs = list(combinations(genres, 2)) or [tuple(genres)]
+                selected_genres = list(pairs[page % len(pairs)])
             
             recommendations = self.spotify_client.get_recommendations(
                 seed_genres=selected_genres,
                 limit=limit,
-                **self._get_audio_features_params(emotion_config)
+                **self._get_audio_features_params(emotion_config, page=page)
             )
             
-            if recommendations and recommendations.get('tracks'):
+            if recommendations is None:
+                return None
+            if recommendations.get('tracks'):
                 return [self._create_song_from_track(track) for track in recommendations['tracks']]
             
         except Exception as e:
             print(f"ジャンルベース推薦でエラー: {e}")
+            return None
         
         return []
     
-    def _get_songs_from_search(self, emotion: str, limit: int) -> List[Song]:
-        """検索ベースの推薦"""
+    def _get_songs_from_search(self, emotion: str, limit: int, page: int = 0) -> Optional[List[Song]]:
+        """検索ベースの推薦（すべての検索に失敗した場合はNone）"""
         try:
             # 感情に関連するキーワードで検索
             search_queries = self._get_search_queries_for_emotion(emotion)
             songs = []
+            per_query = max(1, limit // len(search_queries))
+            failed = 0
             
             for query in search_queries:
-                search_results = self.spotify_client.search_tracks(query, limit=limit//len(search_queries))
-                if search_results and search_results.get('tracks', {}).get('items'):
+                search_results = self.spotify_client.search_tracks(query, limit=per_query, offset=page * per_query)
+                if search_results is None:
+                    failed += 1
+                    continue
+                if search_results.get('tracks', {}).get('items'):
                     for track in search_results['tracks']['items']:
                         songs.append(self._create_song_from_track(track))
                         if len(songs) >= limit:
@@ -216,28 +241,32 @@ class EmotionSongManager:
                 if len(songs) >= limit:
                     break
             
+            if failed == len(search_queries):
+                return None
             return songs
             
         except Exception as e:
             print(f"検索ベース推薦でエラー: {e}")
         
-        return []
+        return None
     
-    def _get_additional_songs(self, emotion_config: Dict, limit: int, seen_ids: set) -> List[Song]:
+    def _get_additional_songs(self, emotion_config: Dict, limit: int, seen_songs: set, page: int = 0) -> List[Song]:
         """追加の楽曲を取得"""
         try:
             # より広い範囲で推薦を取得
             recommendations = self.spotify_client.get_recommendations(
                 seed_genres=emotion_config.get('genres', [])[:1],
                 limit=limit * 2,  # 多めに取得して重複を除去
-                **self._get_audio_features_params(emotion_config, relaxed=True)
+                **self._get_audio_features_params(emotion_config, relaxed=True, page=page)
             )
             
             additional_songs = []
             if recommendations and recommendations.get('tracks'):
                 for track in recommendations['tracks']:
-                    if track['id'] not in seen_ids:
-                        additional_songs.append(self._create_song_from_track(track))
+                    song = self._create_song_from_track(track)
+                    if song not in seen_songs:
+                        seen_songs.add(song)
+                        additional_songs.append(song)
                         if len(additional_songs) >= limit:
                             break
             
@@ -248,22 +277,23 @@ class EmotionSongManager:
         
         return []
     
-    def _get_audio_features_params(self, emotion_config: Dict, relaxed: bool = False) -> Dict:
-        """音楽特徴量パラメータを取得"""
+    def _get_audio_features_params(self, emotion_config: Dict, relaxed: bool = False, page: int = 0) -> Dict:
+        """音楽特徴量パラメータを取得（page ごとに目標値を範囲内で少しずらす）"""
         params = {}
         
         # 緩い設定の場合は範囲を広げる
         tolerance = 0.3 if relaxed else 0.2
+        shift = self.PAGE_TARGET_SHIFTS[page % len(self.PAGE_TARGET_SHIFTS)]
         
         for key, value in emotion_config.items():
             if key.startswith('target_'):
                 param_name = key.replace('target_', '')
                 if param_name in ['valence', 'energy', 'danceability']:
-                    params[f'target_{param_name}'] = value
+                    params[f'target_{param_name}'] = round(min(1, max(0, value + shift)), 2)
                     params[f'min_{param_name}'] = max(0, value - tolerance)
                     params[f'max_{param_name}'] = min(1, value + tolerance)
                 elif param_name == 'tempo':
-                    params[f'target_{param_name}'] = value
+                    params[f'target_{param_name}'] = value + int(shift * 100)
                     params[f'min_{param_name}'] = max(50, value - 20)
                     params[f'max_{param_name}'] = min(200, value + 20)
         
@@ -292,39 +322,46 @@ class EmotionSongManager:
         artist = ', '.join([artist['name'] for artist in track.get('artists', [])])
         
         # 画像URLを取得（複数サイズがある場合は中程度のサイズを選択）
-        image_url = "https://via.placeholder.com/250x250/666/white?text=No+Image"
+        image_url = placeholder_url("No Image", "666", "white")
+        images = []
         if track.get('album', {}).get('images'):
-            images = track['album']['images']
+            # 表示側で解像度に応じて選べるよう、すべてのサイズを保持
+            images = [
+                {'url': image['url'], 'width': image.get('width'), 'height': image.get('height')}
+                for image in track['album']['images'] if image.get('url')
+            ]
             if images:
-                # 中程度のサイズを選択（通常は300x300程度）
+                # 既定値は中程度のサイズ（通常は300x300程度）
                 image_url = images[1]['url'] if len(images) > 1 else images[0]['url']
         
-        return Song(
+        # 別の手法で取得済みのトラックは同じ Song を共有する
+        return intern_song(Song(
             title=title,
             artist=artist,
             image_url=image_url,
             spotify_id=track.get('id'),
             preview_url=track.get('preview_url'),
-            spotify_uri=track.get('uri')
-        )
+            spotify_uri=track.get('uri'),
+            images=images
+        ))
     
     def _get_fallback_songs(self, emotion: str, limit: int) -> List[Song]:
         """Spotify APIが使用できない場合のフォールバック楽曲"""
         fallback_songs = {
             "幸せ": [
-                Song("Happy", "Pharrell Williams", "https://via.placeholder.com/250x250/FFD700/black?text=Happy"),
-                Song("Good as Hell", "Lizzo", "https://via.placeholder.com/250x250/FF69B4/white?text=Good+as+Hell"),
-                Song("Uptown Funk", "Mark Ronson ft. Bruno Mars", "https://via.placeholder.com/250x250/FF4500/white?text=Uptown+Funk"),
+                Song("Happy", "Pharrell Williams", placeholder_url("Happy", "FFD700", "black")),
+                Song("Good as Hell", "Lizzo", placeholder_url("Good as Hell", "FF69B4", "white")),
+                Song("Uptown Funk", "Mark Ronson ft. Bruno Mars", placeholder_url("Uptown Funk", "FF4500", "white")),
             ],
             "悲しい": [
-                Song("Someone Like You", "Adele", "https://via.placeholder.com/250x250/4682B4/white?text=Someone+Like+You"),
-                Song("Hurt", "Johnny Cash", "https://via.placeholder.com/250x250/2F4F4F/white?text=Hurt"),
-                Song("Mad World", "Gary Jules", "https://via.placeholder.com/250x250/696969/white?text=Mad+World"),
+                Song("Someone Like You", "Adele", placeholder_url("Someone Like You", "4682B4", "white")),
+                Song("Hurt", "Johnny Cash", placeholder_url("Hurt", "2F4F4F", "white")),
+                Song("Mad World", "Gary Jules", placeholder_url("Mad World", "696969", "white")),
             ],
             "リラックス": [
-                Song("Weightless", "Marconi Union", "https://via.placeholder.com/250x250/87CEEB/white?text=Weightless"),
-                Song("Clair de Lune", "Claude Debussy", "https://via.placeholder.com/250x250/E6E6FA/black?text=Clair+de+Lune"),
-                Song("Aqueous Transmission", "Incubus", "https://via.placeholder.com/250x250/40E0D0/white?text=Aqueous"),
+                Song("Weightless", "Marconi Union", placeholder_url("Weightless", "87CEEB", "white")),
+                Song("Clair de Lune", "Claude Debussy", placeholder_url("Clair de Lune", "E6E6FA", "black")),
+                Song("Aqueous Transmission", "Incubus", placeholder_url("Aqueous", "40E0D0", "white")),
             ],
             # 他の感情のフォールバック楽曲も追加...
         }
@@ -332,9 +369,13 @@ class EmotionSongManager:
         emotion_songs = fallback_songs.get(emotion, [])
         return emotion_songs[:limit]
     
+    def song_producer(self, emotion: str, page_size: int = 20):
+        """SongManager.set_producer() に渡す、指定された感情の楽曲の供給元"""
+        return lambda page: self.generate_songs_page(emotion, page_size, page)
+    
     def set_emotion_songs(self, emotion: str, limit: int = 10):
         """指定された感情の楽曲を設定"""
-        self.current_emotion_songs = self.generate_songs_for_emotion(emotion, limit)
+        self.current_emotion_songs = SongTable.from_songs(self.generate_songs_for_emotion(emotion, limit))
         self.current_index = 0
     
     def get_current_song(self) -> Optional[Song]:
@@ -367,5 +408,5 @@ class EmotionSongManager:
     def shuffle_songs(self):
         """楽曲リストをシャッフル"""
         if self.current_emotion_songs:
-            random.shuffle(self.current_emotion_songs)
+            self.current_emotion_songs = self.current_emotion_songs.shuffled()
             self.current_index = 0
@@ -0,0 +1,70 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# 既定のタイムアウト（接続, 読み込み）秒
+DEFAULT_TIMEOUT = (5, 15)
+
+
+class HttpTransport:
+    """接続を使い回すスレッドセーフなHTTPトランスポート
+
+    1つの requests.Session をアプリ全体で共有し、Keep-Aliveで TCP/TLS 接続を
+    再利用する。ホストごとの同時接続数は pool_maxsize までに制限され、
+    超えたリクエストは空きが出るまで待つ。タイムアウトを指定しない
+    リクエストには DEFAULT_TIMEOUT を適用する。
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=8, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        # pool_connections: 接続プールを保持するホスト数
+        # pool_maxsize: ホストごとの最大接続数（pool_block=True で上限を超えない）
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+            max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+    def request(self, method, url, **kwargs):
+        """HTTPリクエストを実行してレスポンスを返す"""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        """GETリクエスト"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """POSTリクエスト"""
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """プール中の接続をすべて閉じる"""
+        self.session.close()
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport():
+    """アプリ全体で共有するトランスポートを取得（初回呼び出し時に作成）"""
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport()
+        return _default_transport
+
+
+def set_default_transport(transport):
+    """共有トランスポートを差し替え（テスト用のフェイクなど）"""
+    global _default_transport
+    with _default_transport_lock:
+        _default_transport = transport
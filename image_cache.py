@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class PixmapMemoryCache:
+    """スケール済みQPixmapのLRUキャッシュ（GUIスレッド専用）
+
+    キーは (url, (幅, 高さ)) で、上限を超えると最も古く使われたものから破棄する。
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, url, size):
+        """キャッシュされた画像を取得（なければNone）"""
+        key = (url, tuple(size))
+        pixmap = self._entries.get(key)
+        if pixmap is not None:
+            self._entries.move_to_end(key)
+        return pixmap
+
+    def put(self, url, size, pixmap):
+        """画像をキャッシュに追加"""
+        key = (url, tuple(size))
+        self._entries[key] = pixmap
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """キャッシュをクリア"""
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskImageCache:
+    """URLのハッシュをキーにしたディスク上の画像キャッシュ（スレッドセーフ）
+
+    画像データと ETag / Last-Modified などのメタ情報を保存する。
+    fresh_seconds 以内のエントリはネットワークを使わずにそのまま返し、
+    それ以降は条件付きリクエストで再検証する。合計サイズが max_bytes を
+    超えると最終アクセスが古いものから削除する。
+    """
+
+    def __init__(self, directory=None, max_bytes=100 * 1024 * 1024, fresh_seconds=7 * 24 * 3600):
+        self.directory = directory or os.path.join(os.path.expanduser("~"), ".cache", "meetune", "images")
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 初回アクセス時にディレクトリを走査して求める
+
+    def _paths(self, url):
+        """URLに対応するデータファイルとメタファイルのパスを取得"""
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, digest[:2], digest)
+        return base + ".img", base + ".json"
+
+    def _ensure_initialized(self):
+        """キャッシュディレクトリを作成し、現在の合計サイズを求める（ロック保持中に呼ぶ）"""
+        if self._total_bytes is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        total = 0
+        for entry in self._iter_data_files():
+            total += entry[2]
+        self._total_bytes = total
+
+    def _iter_data_files(self):
+        """(パス, 最終アクセス時刻, サイズ) を列挙"""
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".img"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_mtime, stat.st_size
+
+    def get(self, url):
+        """キャッシュからデータとメタ情報を取得（なければ (None, None)）"""
+        data_path, meta_path = self._paths(url)
+        with self._lock:
+            self._ensure_initialized()
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(data_path, "rb") as f:
+                    data = f.read()
+                # 最終アクセス時刻を更新（LRU削除の基準）
+                os.utime(data_path)
+                return data, meta
+            except (OSError, ValueError):
+                return None, None
+
+    def contains(self, url):
+        """データがキャッシュにあるかどうか（ファイルは読まない）"""
+        return os.path.exists(self._paths(url)[0])
+
+    def is_fresh(self, meta):
+        """再検証なしで使える新しさかどうか"""
+        return bool(meta) and time.time() - meta.get("fetched_at", 0) < self.fresh_seconds
+
+    def put(self, url, data, etag=None, last_modified=None):
+        """データをキャッシュに保存"""
+        data_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "size": len(data)
+        }
+        with self._lock:
+            self._ensure_initialized()
+            try:
+                os.makedirs(os.path.dirname(data_path), exist_ok=True)
+                old_size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+                self._write_atomic(data_path, data)
+                self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+                self._total_bytes += len(data) - old_size
+            except OSError as e:
+                print(f"画像キャッシュ書き込みエラー: {e}")
+                return
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def touch(self, url):
+        """再検証に成功したエントリの取得時刻を更新"""
+        data_path, meta_path = self._paths(url)
+        with self._lock:
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                meta["fetched_at"] = time.time()
+                self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+            except (OSError, ValueError):
+                pass
+
+    def clear(self):
+        """キャッシュをすべて削除"""
+        with self._lock:
+            self._ensure_initialized()
+            for path, _mtime, _size in list(self._iter_data_files()):
+                self._remove_entry(path)
+            self._total_bytes = 0
+
+    def _evict(self):
+        """合計サイズが上限の90%になるまで古いエントリを削除（ロック保持中に呼ぶ）"""
+        target = self.max_bytes * 0.9
+        for path, _mtime, size in sorted(self._iter_data_files(), key=lambda entry: entry[1]):
+            if self._total_bytes <= target:
+                break
+            self._remove_entry(path)
+            self._total_bytes -= size
+
+    @staticmethod
+    def _remove_entry(data_path):
+        """データファイルとメタファイルを削除"""
+        for path in (data_path, data_path[:-len(".img")] + ".json"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _write_atomic(path, payload):
+        """一時ファイル経由で書き込み、途中で落ちても壊れたファイルを残さない"""
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
@@ -1,30 +1,325 @@
+import time
+import threading
 import requests
-from PyQt6.QtGui import QPixmap
-from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QPixmap, QImage, QImageReader
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QBuffer, QByteArray, QIODevice, pyqtSignal
+from image_cache import PixmapMemoryCache, DiskImageCache
+from placeholder_renderer import is_placeholder_url, render_placeholder
+from http_transport import get_default_transport
+
+
+# 他のウィジェット用に一緒に作っておくサムネイルのサイズ
+THUMBNAIL_SIZES = ((64, 64),)
+
+
+class DecodeStats:
+    """画像デコードの統計を集計するクラス（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """統計をリセット"""
+        with self._lock:
+            self.count = 0
+            self.total_seconds = 0.0
+            self.compressed_bytes = 0   # 入力データのバイト数
+            self.decoded_bytes = 0      # デコード後の画像のバイト数
+            self.full_size_bytes = 0    # 元サイズでデコードした場合のバイト数
+
+    def record(self, seconds, compressed_bytes, decoded_bytes, full_size_bytes):
+        """1回分のデコード結果を記録"""
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.compressed_bytes += compressed_bytes
+            self.decoded_bytes += decoded_bytes
+            self.full_size_bytes += full_size_bytes
+
+    def summary(self):
+        """統計の概要を取得"""
+        with self._lock:
+            return {
+                "count": self.count,
+                "total_ms": self.total_seconds * 1000,
+                "average_ms": self.total_seconds * 1000 / self.count if self.count else 0.0,
+                "compressed_bytes": self.compressed_bytes,
+                "decoded_bytes": self.decoded_bytes,
+                "saved_bytes": self.full_size_bytes - self.decoded_bytes
+            }
+
+    def report(self):
+        """統計を表示用の文字列にする"""
+        s = self.summary()
+        return (f"画像デコード: {s['count']}回, 合計 {s['total_ms']:.1f}ms (平均 {s['average_ms']:.2f}ms), "
+                f"入力 {s['compressed_bytes'] / 1024:.1f}KB, デコード後 {s['decoded_bytes'] / 1024:.1f}KB, "
+                f"節約 {s['saved_bytes'] / 1024:.1f}KB")
 
 
 class ImageLoader:
     """画像読み込み処理クラス"""
+
+    # アプリ全体で共有するキャッシュ（メモリ上のLRU + ディスク）
+    memory_cache = PixmapMemoryCache()
+    disk_cache = DiskImageCache()
+
+    # デコード時間とバイト数の統計
+    decode_stats = DecodeStats()
+
     @staticmethod
-    def load_pixmap_from_url(url, size=(300, 300), timeout=10):
-        """URLから画像を読み込んでQPixmapを返す"""
+    def fetch_image_bytes(url, timeout=10, cache=None):
+        """画像データを取得（ディスクキャッシュ優先、期限切れは条件付きリクエストで再検証）
+
+        cache を指定すると画像以外（プレビュー音声など）のキャッシュとしても使える。
+        """
+        cache = cache or ImageLoader.disk_cache
+        cached_data, meta = cache.get(url)
+        if cached_data is not None and cache.is_fresh(meta):
+            return cached_data
+
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
         try:
-            print(f"画像を読み込み中: {url}")
-            response = requests.get(url, timeout=timeout)
+            response = get_default_transport().get(url, headers=headers, timeout=timeout)
+            if response.status_code == 304 and cached_data is not None:
+                cache.touch(url)
+                return cached_data
             response.raise_for_status()
-            
-            pixmap = QPixmap()
-            if pixmap.loadFromData(response.content):
-                scaled_pixmap = pixmap.scaled(
-                    size[0], size[1], 
+        except requests.exceptions.RequestException:
+            # オフライン時などは古いキャッシュでも表示する
+            if cached_data is not None:
+                return cached_data
+            raise
+
+        cache.put(url, response.content,
+                  etag=response.headers.get("ETag"),
+                  last_modified=response.headers.get("Last-Modified"))
+        return response.content
+
+    @staticmethod
+    def select_image_url(song, target_px):
+        """目標のデバイスピクセルサイズを満たす最小の画像URLを選択"""
+        variants = [image for image in song.images if image.get('width') and image.get('height')]
+        if not variants:
+            return song.image_url
+
+        covering = [image for image in variants if min(image['width'], image['height']) >= target_px]
+        if covering:
+            return min(covering, key=lambda image: image['width'] * image['height'])['url']
+        # 目標に届くものがなければ最大のものを使う
+        return max(variants, key=lambda image: image['width'] * image['height'])['url']
+
+    @staticmethod
+    def select_preview_image_url(song):
+        """最初に表示する最小サイズの画像URLを選択（サイズ違いがなければNone）"""
+        variants = [image for image in song.images if image.get('width') and image.get('height')]
+        if len(variants) < 2:
+            return None
+        return min(variants, key=lambda image: image['width'] * image['height'])['url']
+
+    @staticmethod
+    def card_image_request(song, size=(300, 300), device_pixel_ratio=1.0):
+        """カード表示用の (URL, デバイスピクセル単位のサイズ) を取得"""
+        target = (round(size[0] * device_pixel_ratio), round(size[1] * device_pixel_ratio))
+        return ImageLoader.select_image_url(song, max(target)), target
+
+    @staticmethod
+    def decode_image(data, size=(300, 300)):
+        """画像データを目標サイズで直接デコードしてQImageを返す
+
+        ヘッダーから元の解像度を読み、QImageReader の縮小デコードを使うことで
+        フル解像度の画像をメモリ上に展開しない。
+        """
+        start = time.perf_counter()
+
+        buffer = QBuffer()
+        buffer.setData(QByteArray(data))
+        buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+        reader = QImageReader(buffer)
+
+        # ヘッダーのみを読んで元のサイズを取得
+        original_size = reader.size()
+        if original_size.isValid():
+            target_size = original_size.scaled(size[0], size[1], Qt.AspectRatioMode.KeepAspectRatio)
+            if target_size.width() < original_size.width():
+                reader.setScaledSize(target_size)
+
+        image = reader.read()
+        if image.isNull():
+            raise Exception(f"画像データの読み込みに失敗: {reader.errorString()}")
+
+        # 縮小デコードに対応していない形式は通常どおり縮小する
+        if image.width() > size[0] or image.height() > size[1]:
+            image = image.scaled(
+                size[0], size[1],
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            )
+
+        bytes_per_pixel = max(1, image.depth() // 8)
+        full_size_bytes = (original_size.width() * original_size.height() * bytes_per_pixel
+                           if original_size.isValid() else image.sizeInBytes())
+        ImageLoader.decode_stats.record(time.perf_counter() - start, len(data), image.sizeInBytes(), full_size_bytes)
+        return image
+
+    @staticmethod
+    def make_thumbnails(image):
+        """デコード済みの画像からサムネイルを作成（元画像より小さいサイズのみ）"""
+        thumbnails = {}
+        for thumb_size in THUMBNAIL_SIZES:
+            if image.width() > thumb_size[0] or image.height() > thumb_size[1]:
+                thumbnails[thumb_size] = image.scaled(
+                    thumb_size[0], thumb_size[1],
                     Qt.AspectRatioMode.KeepAspectRatio,
                     Qt.TransformationMode.SmoothTransformation
                 )
-                print("画像読み込み成功")
-                return scaled_pixmap
-            else:
-                raise Exception("画像データの読み込みに失敗")
-                
+        return thumbnails
+
+    @staticmethod
+    def store_thumbnails(url, thumbnails):
+        """サムネイルをメモリキャッシュに格納（GUIスレッド専用）"""
+        for thumb_size, thumb in thumbnails.items():
+            if ImageLoader.memory_cache.get(url, thumb_size) is None:
+                ImageLoader.memory_cache.put(url, thumb_size, QPixmap.fromImage(thumb))
+
+    @staticmethod
+    def load_image_from_url(url, size=(300, 300), timeout=10):
+        """URLから画像を読み込んでQImageを返す（ワーカースレッドからも呼び出し可能）"""
+        # プレースホルダーはネットワークを使わずにその場で描画
+        if is_placeholder_url(url):
+            return render_placeholder(url, size)
+
+        try:
+            print(f"画像を読み込み中: {url}")
+            data = ImageLoader.fetch_image_bytes(url, timeout)
+            image = ImageLoader.decode_image(data, size)
+            print("画像読み込み成功")
+            return image
+
         except Exception as e:
             print(f"画像読み込みエラー: {e}")
             return None
+
+    @staticmethod
+    def load_pixmap_from_url(url, size=(300, 300), timeout=10):
+        """URLから画像を読み込んでQPixmapを返す（GUIスレッド専用）"""
+        pixmap = ImageLoader.memory_cache.get(url, size)
+        if pixmap is not None:
+            return pixmap
+
+        image = ImageLoader.load_image_from_url(url, size, timeout)
+        if image is None:
+            return None
+        pixmap = QPixmap.fromImage(image)
+        ImageLoader.memory_cache.put(url, size, pixmap)
+        return pixmap
+
+
+class _ImageLoadSignals(QObject):
+    """ワーカーからGUIスレッドへ結果を届けるためのシグナル"""
+    finished = pyqtSignal(int, QImage)
+    thumbnails_ready = pyqtSignal(str, object)  # URL, {サイズ: QImage}
+
+
+class _ImageLoadTask(QRunnable):
+    """画像のダウンロードとデコードを行うワーカータスク"""
+    def __init__(self, loader, request_id, url, size):
+        super().__init__()
+        self.loader = loader
+        self.request_id = request_id
+        self.url = url
+        self.size = size
+
+    def run(self):
+        # 開始前にキャンセルされていればダウンロードしない
+        if self.loader.is_cancelled(self.request_id):
+            return
+
+        image = ImageLoader.load_image_from_url(self.url, self.size)
+        if image is not None:
+            thumbnails = ImageLoader.make_thumbnails(image)
+            if thumbnails:
+                self.loader._signals.thumbnails_ready.emit(self.url, thumbnails)
+        self.loader._signals.finished.emit(self.request_id, image if image is not None else QImage())
+
+
+class AsyncImageLoader(QObject):
+    """画像をGUIスレッド外で読み込むクラス
+
+    load() はリクエストIDを即座に返し、完了すると image_loaded シグナルで
+    QPixmap を通知する（失敗時は null の QPixmap）。キャンセルされた
+    リクエストの結果は破棄される。
+    """
+
+    # シグナル定義
+    image_loaded = pyqtSignal(int, QPixmap)  # リクエストID, 画像
+
+    def __init__(self, max_workers=4, parent=None):
+        super().__init__(parent)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max_workers)
+
+        self._lock = threading.Lock()
+        self._next_request_id = 0
+        self._pending = {}  # 未完了かつ未キャンセルのリクエストID -> (url, size)
+
+        # GUIスレッドに属するシグナルオブジェクト（ワーカーからの emit はキュー経由で届く）
+        self._signals = _ImageLoadSignals()
+        self._signals.finished.connect(self._on_task_finished)
+        self._signals.thumbnails_ready.connect(ImageLoader.store_thumbnails)
+
+    def get_cached(self, url, size=(300, 300)):
+        """メモリキャッシュ済みの画像を取得（なければNone）
+
+        プレースホルダーはキャッシュになければその場で描画して返す。
+        """
+        pixmap = ImageLoader.memory_cache.get(url, size)
+        if pixmap is None and is_placeholder_url(url):
+            pixmap = QPixmap.fromImage(render_placeholder(url, size))
+            ImageLoader.memory_cache.put(url, size, pixmap)
+        return pixmap
+
+    def load(self, url, size=(300, 300)):
+        """画像の読み込みを開始してリクエストIDを返す"""
+        with self._lock:
+            self._next_request_id += 1
+            request_id = self._next_request_id
+            self._pending[request_id] = (url, tuple(size))
+
+        self.thread_pool.start(_ImageLoadTask(self, request_id, url, size))
+        return request_id
+
+    def cancel(self, request_id):
+        """リクエストをキャンセル（結果は通知されない）"""
+        with self._lock:
+            self._pending.pop(request_id, None)
+
+    def cancel_all(self):
+        """すべての未完了リクエストをキャンセル"""
+        with self._lock:
+            self._pending.clear()
+
+    def is_cancelled(self, request_id):
+        """リクエストがキャンセル済み（または完了済み）かチェック"""
+        with self._lock:
+            return request_id not in self._pending
+
+    def _on_task_finished(self, request_id, image):
+        """ワーカー完了時の処理（GUIスレッドで実行）"""
+        with self._lock:
+            if request_id not in self._pending:
+                return  # キャンセル済みの結果は破棄
+            url, size = self._pending.pop(request_id)
+
+        # QPixmap はGUIスレッドでのみ生成できる
+        pixmap = QPixmap()
+        if not image.isNull():
+            pixmap = QPixmap.fromImage(image)
+            ImageLoader.memory_cache.put(url, size, pixmap)
+        self.image_loaded.emit(request_id, pixmap)
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from song import Song, intern_song
+
+
+class PlaylistJobJournal:
+    """プレイリスト作成ジョブの進捗をディスクに記録するジャーナル
+
+    ジョブごとに JSON ファイルを1つ持ち、作成したプレイリストのID、
+    ここまでに解決したURI、書き込みのチェックポイントを保存する。
+    途中で落ちたりキャンセルしたりしても、pending_jobs() の記録から
+    （または同じ内容で作り直せば）プレイリストを重複して作らずに
+    続きから再開できる。
+    """
+
+    # この期間更新されていない記録は再開しないものとして prune() で削除する
+    MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(os.path.expanduser("~"), ".cache", "meetune", "jobs")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def job_key(playlist_name, songs):
+        """プレイリスト名と楽曲リストからジョブのキーを作成"""
+        digest = hashlib.sha256()
+        digest.update(playlist_name.encode("utf-8"))
+        for song in songs:
+            digest.update(b"\0")
+            digest.update(str(song).encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def song_entry(song):
+        """楽曲を記録用の値に変換（Song は URI などを含む辞書、文字列はそのまま）"""
+        return song.to_dict() if isinstance(song, Song) else str(song)
+
+    @staticmethod
+    def entry_label(entry):
+        """記録された楽曲の "タイトル - アーティスト"（job_key と同じ表記）"""
+        return str(Song.from_dict(entry)) if isinstance(entry, dict) else entry
+
+    @staticmethod
+    def songs_from_state(state):
+        """記録された楽曲リストを復元（URIなどが分かっている楽曲は Song に戻す）"""
+        return [intern_song(Song.from_dict(entry)) if isinstance(entry, dict) else entry
+                for entry in state.get("songs", [])]
+
+    @staticmethod
+    def new_state(job_key, playlist_name, songs, is_public):
+        """新しいジョブの状態を作成"""
+        return {
+            "job_key": job_key,
+            "playlist_name": playlist_name,
+            "is_public": is_public,
+            "songs": [PlaylistJobJournal.song_entry(song) for song in songs],
+            "playlist_id": None,
+            "resolved": [],       # 入力順の解決結果（見つからなかった楽曲はNone）
+            "checkpoint": None,   # WriteCheckpoint.to_dict()
+            "updated_at": time.time()
+        }
+
+    def load(self, job_key):
+        """記録されているジョブの状態を取得（なければNone）"""
+        try:
+            with open(self._path(job_key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"ジョブ記録の読み込みエラー: {e}")
+            return None
+
+    def save(self, state):
+        """ジョブの状態を保存"""
+        state["updated_at"] = time.time()
+        payload = json.dumps(state, ensure_ascii=False).encode("utf-8")
+        path = self._path(state["job_key"])
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"ジョブ記録の書き込みエラー: {e}")
+
+    def remove(self, job_key):
+        """完了したジョブの記録を削除"""
+        with self._lock:
+            try:
+                os.remove(self._path(job_key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"ジョブ記録の削除エラー: {e}")
+
+    def pending_jobs(self):
+        """未完了のジョブの状態の一覧（更新が新しい順）"""
+        if not os.path.isdir(self.directory):
+            return []
+        states = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                state = self.load(name[:-len(".json")])
+                if state is not None:
+                    states.append(state)
+        states.sort(key=lambda state: state.get("updated_at", 0), reverse=True)
+        return states
+
+    def prune(self, max_age=None):
+        """再開できない・再開しない記録を削除して、削除した件数を返す
+
+        Spotify上にまだプレイリストを作っていない記録（作り直しても重複しない）と、
+        max_age 秒以上更新されていない記録が対象。実行中のジョブがない起動時に呼ぶ。
+        """
+        max_age = self.MAX_AGE_SECONDS if max_age is None else max_age
+        now = time.time()
+        removed = 0
+        for state in self.pending_jobs():
+            if not state.get("playlist_id") or now - state.get("updated_at", 0) > max_age:
+                self.remove(state["job_key"])
+                removed += 1
+        return removed
+
+    @staticmethod
+    def extends(state, songs):
+        """songs が記録の楽曲リストの後ろに曲を足しただけのものか（そのまま続きから再開できるか）"""
+        recorded = [PlaylistJobJournal.entry_label(entry) for entry in state.get("songs", [])]
+        return [str(song) for song in songs[:len(recorded)]] == recorded
+
+    def _path(self, job_key):
+        return os.path.join(self.directory, f"{job_key}.json")
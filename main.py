@@ -8,215 +8,22 @@ import requests
 from datetime import datetime
 from PyQt6.QtWidgets import (QApplication, QWidget, QHBoxLayout, QVBoxLayout, 
                              QMessageBox, QPushButton, QLineEdit, QDialog, QLabel,
-                             QInputDialog, QProgressDialog, QCheckBox)
-from PyQt6.QtCore import QTimer, Qt, QUrl, QThread, pyqtSignal
+                             QInputDialog, QCheckBox)
+from PyQt6.QtCore import QTimer, Qt, QUrl
 from song_manager import SongManager
 from playlist_manager import PlaylistManager
+from playlist_journal import PlaylistJournal
 from swipeable_widget import SwipeableWidget
 from song_display_widget import SongDisplayWidget
 from playlist_widget import PlaylistWidget
 from spotify_auth import SpotifyAuthenticator, SpotifyClient
 from emotion_song_manager import EmotionSongManager
-
-class PlaylistCreationThread(QThread):
-    """プレイリスト作成を別スレッドで実行"""
-    progress_updated = pyqtSignal(str)
-    finished_signal = pyqtSignal(bool, str)
-    
-    def __init__(self, spotify_client, playlist_name, songs, is_public=False):
-        super().__init__()
-        self.spotify_client = spotify_client
-        self.playlist_name = playlist_name
-        self.songs = songs
-        self.is_public = is_public
-        
-    def run(self):
-        try:
-            # ユーザー情報を取得
-            self.progress_updated.emit("ユーザー情報を取得中...")
-            user_info = self.spotify_client.get_current_user()
-            if not user_info:
-                self.finished_signal.emit(False, "ユーザー情報の取得に失敗しました")
-                return
-            
-            user_id = user_info.get("id")
-            self.progress_updated.emit(f"ユーザー: {user_info.get('display_name', user_id)}")
-            
-            # プレイリストを作成
-            self.progress_updated.emit("プレイリストを作成中...")
-            playlist_description = f"MEET une アプリで作成 - {datetime.now().strftime('%Y年%m月%d日')}"
-            playlist_info = self.spotify_client.create_playlist(
-                user_id, 
-                self.playlist_name, 
-                playlist_description, 
-                self.is_public
-            )
-            
-            if not playlist_info:
-                self.finished_signal.emit(False, "プレイリストの作成に失敗しました")
-                return
-            
-            playlist_id = playlist_info.get("id")
-            self.progress_updated.emit(f"プレイリスト「{self.playlist_name}」を作成しました")
-            
-            # 楽曲を検索してURIを取得
-            track_uris = []
-            failed_tracks = []
-            
-            for i, song in enumerate(self.songs):
-                self.progress_updated.emit(f"楽曲を検索中... ({i+1}/{len(self.songs)}): {song}")
-                
-                # 楽曲を検索
-                search_results = self.spotify_client.search_tracks(song, limit=1)
-                if search_results and search_results.get("tracks", {}).get("items"):
-                    track = search_results["tracks"]["items"][0]
-                    track_uris.append(track["uri"])
-                    self.progress_updated.emit(f"✓ 見つかりました: {track['name']} - {track['artists'][0]['name']}")
-                else:
-                    failed_tracks.append(song)
-                    self.progress_updated.emit(f"✗ 見つかりませんでした: {song}")
-            
-            # 見つかった楽曲をプレイリストに追加
-            if track_uris:
-                self.progress_updated.emit("楽曲をプレイリストに追加中...")
-                
-                # Spotify APIは一度に最大100曲まで追加可能
-                for i in range(0, len(track_uris), 100):
-                    batch = track_uris[i:i+100]
-                    result = self.spotify_client.add_tracks_to_playlist(playlist_id, batch)
-                    if not result:
-                        self.finished_signal.emit(False, f"楽曲の追加に失敗しました (バッチ {i//100 + 1})")
-                        return
-                
-                success_count = len(track_uris)
-                failed_count = len(failed_tracks)
-                
-                success_message = f"プレイリスト「{self.playlist_name}」を作成しました！\n\n"
-                success_message += f"✓ 追加された楽曲: {success_count}曲\n"
-                if failed_count > 0:
-                    success_message += f"✗ 見つからなかった楽曲: {failed_count}曲\n"
-                    success_message += f"見つからなかった楽曲: {', '.join(failed_tracks[:3])}"
-                    if len(failed_tracks) > 3:
-                        success_message += f" など{len(failed_tracks)}曲"
-                
-                success_message += f"\n\nSpotifyアプリでプレイリストを確認できます。"
-                
-                self.finished_signal.emit(True, success_message)
-            else:
-                self.finished_signal.emit(False, "追加できる楽曲が見つかりませんでした")
-                
-        except Exception as e:
-            self.finished_signal.emit(False, f"エラーが発生しました: {str(e)}")
-
-import sys
-import random
-import os
-import urllib.parse
-import webbrowser
-import requests
-from datetime import datetime
-from PyQt6.QtWidgets import (QApplication, QWidget, QHBoxLayout, QVBoxLayout, 
-                             QMessageBox, QPushButton, QLineEdit, QDialog, QLabel,
-                             QInputDialog, QProgressDialog, QCheckBox)
-from PyQt6.QtCore import QTimer, Qt, QUrl, QThread, pyqtSignal
-from song_manager import SongManager
-from playlist_manager import PlaylistManager
-from swipeable_widget import SwipeableWidget
-from song_display_widget import SongDisplayWidget
-from playlist_widget import PlaylistWidget
-from spotify_auth import SpotifyAuthenticator, SpotifyClient
-from emotion_song_manager import EmotionSongManager
-
-class PlaylistCreationThread(QThread):
-    """プレイリスト作成を別スレッドで実行"""
-    progress_updated = pyqtSignal(str)
-    finished_signal = pyqtSignal(bool, str)
-    
-    def __init__(self, spotify_client, playlist_name, songs, is_public=False):
-        super().__init__()
-        self.spotify_client = spotify_client
-        self.playlist_name = playlist_name
-        self.songs = songs
-        self.is_public = is_public
-        
-    def run(self):
-        try:
-            # ユーザー情報を取得
-            self.progress_updated.emit("ユーザー情報を取得中...")
-            user_info = self.spotify_client.get_current_user()
-            if not user_info:
-                self.finished_signal.emit(False, "ユーザー情報の取得に失敗しました")
-                return
-            
-            user_id = user_info.get("id")
-            self.progress_updated.emit(f"ユーザー: {user_info.get('display_name', user_id)}")
-            
-            # プレイリストを作成
-            self.progress_updated.emit("プレイリストを作成中...")
-            playlist_description = f"MEET une アプリで作成 - {datetime.now().strftime('%Y年%m月%d日')}"
-            playlist_info = self.spotify_client.create_playlist(
-                user_id, 
-                self.playlist_name, 
-                playlist_description, 
-                self.is_public
-            )
-            
-            if not playlist_info:
-                self.finished_signal.emit(False, "プレイリストの作成に失敗しました")
-                return
-            
-            playlist_id = playlist_info.get("id")
-            self.progress_updated.emit(f"プレイリスト「{self.playlist_name}」を作成しました")
-            
-            # 楽曲を検索してURIを取得
-            track_uris = []
-            failed_tracks = []
-            
-            for i, song in enumerate(self.songs):
-                self.progress_updated.emit(f"楽曲を検索中... ({i+1}/{len(self.songs)}): {song}")
-                
-                # 楽曲を検索
-                search_results = self.spotify_client.search_tracks(song, limit=1)
-                if search_results and search_results.get("tracks", {}).get("items"):
-                    track = search_results["tracks"]["items"][0]
-                    track_uris.append(track["uri"])
-                    self.progress_updated.emit(f"✓ 見つかりました: {track['name']} - {track['artists'][0]['name']}")
-                else:
-                    failed_tracks.append(song)
-                    self.progress_updated.emit(f"✗ 見つかりませんでした: {song}")
-            
-            # 見つかった楽曲をプレイリストに追加
-            if track_uris:
-                self.progress_updated.emit("楽曲をプレイリストに追加中...")
-                
-                # Spotify APIは一度に最大100曲まで追加可能
-                for i in range(0, len(track_uris), 100):
-                    batch = track_uris[i:i+100]
-                    result = self.spotify_client.add_tracks_to_playlist(playlist_id, batch)
-                    if not result:
-                        self.finished_signal.emit(False, f"楽曲の追加に失敗しました (バッチ {i//100 + 1})")
-                        return
-                
-                success_count = len(track_uris)
-                failed_count = len(failed_tracks)
-                
-                success_message = f"プレイリスト「{self.playlist_name}」を作成しました！\n\n"
-                success_message += f"✓ 追加された楽曲: {success_count}曲\n"
-                if failed_count > 0:
-                    success_message += f"✗ 見つからなかった楽曲: {failed_count}曲\n"
-                    success_message += f"見つからなかった楽曲: {', '.join(failed_tracks[:3])}"
-                    if len(failed_tracks) > 3:
-                        success_message += f" など{len(failed_tracks)}曲"
-                
-                success_message += f"\n\nSpotifyアプリでプレイリストを確認できます。"
-                
-                self.finished_signal.emit(True, success_message)
-            else:
-                self.finished_signal.emit(False, "追加できる楽曲が見つかりませんでした")
-                
-        except Exception as e:
-            self.finished_signal.emit(False, f"エラーが発生しました: {str(e)}")
-
+from song_prefetcher import SongPrefetcher
+from image_loader import ImageLoader
+from response_cache import ResponseCache, SQLiteResponseStore
+from resolution_cache import TrackResolutionCache
+from job_journal import PlaylistJobJournal
+from playlist_jobs import PlaylistJobManager
 
 class SwipeApp(QWidget):
     """メインアプリケーションクラス"""
@@ -226,12 +33,36 @@ class SwipeApp(QWidget):
 
         # Spotify認証オブジェクトとクライアントオブジェクトの初期化
         self.authenticator = SpotifyAuthenticator()
-        self.spotify_client = SpotifyClient(self.authenticator)
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "meetune")
+        os.makedirs(cache_dir, exist_ok=True)
+        response_cache = ResponseCache(store=SQLiteResponseStore(os.path.join(cache_dir, "spotify_responses.sqlite3")))
+        resolution_cache = TrackResolutionCache(os.path.join(cache_dir, "track_resolutions.sqlite3"))
+        self.spotify_client = SpotifyClient(
+            self.authenticator,
+            response_cache=response_cache,
+            resolution_cache=resolution_cache
+        )
         self.access_token = None
         
+        # プレイリスト作成の進捗記録（中断したジョブの再開に使う）
+        self.job_journal = PlaylistJobJournal(os.path.join(cache_dir, "jobs"))
+        # 再開できない（Spotify上に何も作っていない）記録や古い記録を片付ける
+        self.job_journal.prune()
+        # プレイリスト作成ジョブ（同時実行数は環境変数で変更可能）
+        self.job_manager = PlaylistJobManager(
+            self.spotify_client,
+            journal=self.job_journal,
+            max_concurrent_jobs=int(os.getenv('MEETUNE_MAX_PLAYLIST_JOBS', '2')),
+            parent=self
+        )
+        
+        # 次のカードの先読み（先読み曲数は環境変数で変更可能）
+        self.prefetcher = SongPrefetcher(lookahead=int(os.getenv('MEETUNE_PREFETCH_COUNT', '3')), parent=self)
+        
         # 各種マネージャーの初期化
-        self.song_manager = SongManager()
-        self.playlist_manager = PlaylistManager()
+        self.song_manager = SongManager(prefetcher=self.prefetcher, parent=self)
+        # お気に入りは操作ごとにディスクへ記録し、次回起動時に復元する
+        self.playlist_manager = PlaylistManager(journal=PlaylistJournal(os.path.join(cache_dir, "playlist")))
 
         # 感情ベース楽曲マネージャーの初期化
         self.emotion_song_manager = EmotionSongManager(self.spotify_client)
@@ -285,7 +116,8 @@ class SwipeApp(QWidget):
         swipe_layout.addWidget(self.song_display)
 
         # 右側：プレイリストエリア
-        self.playlist_widget = PlaylistWidget()
+        # PlaylistManager と同じ store を表示するので、追加・削除は自動で反映される
+        self.playlist_widget = PlaylistWidget(store=self.playlist_manager.store)
         self.playlist_widget.setMaximumWidth(300)
         
         # 認証ボタンとステータスラベル、感情選択ボタンを配置
@@ -324,6 +156,13 @@ class SwipeApp(QWidget):
         self.swipe_widget.swipe_left.connect(self.on_swipe_left)
         self.swipe_widget.swipe_right.connect(self.on_swipe_right)
         self.playlist_widget.create_spotify_playlist.connect(self.on_create_spotify_playlist)
+        self.playlist_widget.cancel_job_requested.connect(self.job_manager.cancel)
+        self.job_manager.job_added.connect(self.playlist_widget.add_job)
+        self.job_manager.job_updated.connect(self.playlist_widget.update_job)
+        self.job_manager.job_finished.connect(self.on_playlist_job_finished)
+        self.song_manager.songs_added.connect(self.on_songs_added)
+        self.song_manager.producer_exhausted.connect(self.on_songs_exhausted)
+        self.song_display.device_pixel_ratio_changed.connect(self.on_device_pixel_ratio_changed)
         
         # 楽曲表示エリアのダブルクリックで詳細情報を表示（オプション）
         self.song_display.mouseDoubleClickEvent = lambda event: self.show_current_song_info()
@@ -333,9 +172,30 @@ class SwipeApp(QWidget):
         current_song = self.song_manager.get_current_song()
         if current_song:
             self.song_display.display_song(current_song)
+        elif self.song_manager.has_next_song():
+            # 次のページを取得中（届いたら on_songs_added で表示する）
+            self.song_display.show_loading_message()
         else:
             self.song_display.show_completion_message(self.playlist_manager.get_count())
     
+    def on_device_pixel_ratio_changed(self, ratio):
+        """カードの表示先の解像度に合わせて先読みし直す"""
+        self.prefetcher.set_device_pixel_ratio(ratio)
+        self.prefetcher.prefetch_from(self.song_manager.songs, self.song_manager.current_index)
+    
+    def on_songs_added(self, count):
+        """デッキに楽曲が追加された"""
+        print(f"楽曲を{count}曲追加しました（残り{len(self.song_manager.songs) - self.song_manager.current_index}曲）")
+        # 取得待ちの画面を表示していたら、追加された楽曲を表示
+        if self.song_display.current_song is None:
+            self.load_current_song()
+    
+    def on_songs_exhausted(self):
+        """供給元から新しい楽曲が取得できなくなった"""
+        if not self.song_manager.songs:
+            QMessageBox.warning(self, "エラー", "該当する楽曲が見つかりませんでした。")
+        self.load_current_song()
+    
     def on_swipe_right(self):
         """右スワイプ：次の曲へ"""
         print("右スワイプ：次の曲へ")
@@ -347,7 +207,7 @@ class SwipeApp(QWidget):
         current_song = self.song_manager.get_current_song()
         if current_song:
             if self.playlist_manager.add_song(current_song):
-                self.playlist_widget.add_song(current_song)
+                self.playlist_widget.scroll_to_song(current_song)
                 print(f"プレイリストに追加: {current_song}")
             else:
                 print("この曲は既にプレイリストに追加されています")
@@ -358,7 +218,8 @@ class SwipeApp(QWidget):
     
     def on_create_spotify_playlist(self):
         """Spotifyプレイリスト作成"""
-        liked_songs = self.playlist_manager.get_songs()
+        # URIが分かっている楽曲は検索せずに追加できるよう、Songオブジェクトのまま渡す
+        liked_songs = self.playlist_manager.get_song_objects()
         
         if not liked_songs:
             QMessageBox.information(self, "情報", "プレイリストが空です。まず楽曲を追加してください。")
@@ -369,6 +230,10 @@ class SwipeApp(QWidget):
             QMessageBox.warning(self, "認証が必要", "Spotifyプレイリストを作成するには、まずSpotifyにログインしてください。")
             return
         
+        # 作成途中で中断したプレイリストがあれば、先に再開するか確認する
+        if self.offer_pending_playlist_jobs(liked_songs):
+            return
+        
         # プレイリスト名の入力
         playlist_name, ok = QInputDialog.getText(
             self, 
@@ -411,52 +276,44 @@ class SwipeApp(QWidget):
         
         is_public = public_checkbox.isChecked()
         
-        # プログレスダイアログの作成
-        self.progress_dialog = QProgressDialog("プレイリストを作成中...", "キャンセル", 0, 0, self)
-        self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
-        self.progress_dialog.setMinimumDuration(0)
-        self.progress_dialog.setValue(0)
-        
-        # プレイリスト作成スレッドを開始
-        self.creation_thread = PlaylistCreationThread(
-            self.spotify_client, 
-            playlist_name, 
-            liked_songs, 
-            is_public
-        )
-        
-        # スレッドのシグナルを接続
-        self.creation_thread.progress_updated.connect(self.progress_dialog.setLabelText)
-        self.creation_thread.finished_signal.connect(self.handle_playlist_creation_finished)
-        
-        # キャンセル処理
-        self.progress_dialog.canceled.connect(self.creation_thread.quit)
-        
-        self.creation_thread.start()
-        self.progress_dialog.exec()
+        # バックグラウンドで作成する（進捗はプレイリスト欄に表示され、スワイプは続けられる）
+        job_id = self.job_manager.submit(playlist_name, liked_songs, is_public)
+        if job_id is None:
+            QMessageBox.information(self, "情報", "同じ内容のプレイリストを作成中です。")
     
-    def handle_playlist_creation_finished(self, success, message):
-        """プレイリスト作成完了時の処理"""
-        self.on_playlist_creation_finished(success, message, self.progress_dialog)
-    
-    def on_playlist_creation_finished(self, success, message, progress_dialog):
-        """プレイリスト作成完了時の処理"""
-        progress_dialog.close()
-        
-        if success:
-            QMessageBox.information(self, "成功", message)
-            # 作成成功時に現在のプレイリストをクリア（オプション）
+    def offer_pending_playlist_jobs(self, liked_songs):
+        """中断されたプレイリスト作成ジョブの再開を確認（新規作成をやめる場合は True）"""
+        for state in self.job_manager.pending_jobs():
+            recorded_count = len(state.get("songs", []))
+            resolved_count = len(state.get("resolved", []))
+            extends = PlaylistJobJournal.extends(state, liked_songs)
+            message = (f"作成途中のプレイリスト「{state['playlist_name']}」があります"
+                       f"（{resolved_count}/{recorded_count}曲 検索済み）。\n\n")
+            if extends and len(liked_songs) > recorded_count:
+                message += f"続きから再開し、その後に追加した{len(liked_songs) - recorded_count}曲も追加しますか？"
+            else:
+                message += "続きから再開しますか？"
+            message += "\n（「いいえ」を選ぶと途中の記録を破棄します）"
+            
             reply = QMessageBox.question(
                 self,
-                "プレイリストをクリア",
-                "プレイリストの作成が完了しました。\n現在のプレイリストをクリアしますか？",
-                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+                "プレイリスト作成の再開",
+                message,
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel
             )
             if reply == QMessageBox.StandardButton.Yes:
-                self.playlist_manager.clear_playlist()
-                self.playlist_widget.clear_playlist()
-        else:
-            QMessageBox.warning(self, "エラー", message)
+                self.job_manager.resume(state, liked_songs)
+                return True
+            if reply == QMessageBox.StandardButton.No:
+                self.job_manager.discard(state)
+                continue
+            return True
+        return False
+    
+    def on_playlist_job_finished(self, job_id, success, message):
+        """プレイリスト作成ジョブ終了時の処理（詳細は行のツールチップに表示）"""
+        self.playlist_widget.finish_job(job_id, success, message)
+        print(message)
 
     def show_notification(self):
         """BeRealのような通知を表示する"""
@@ -567,9 +424,8 @@ class SwipeApp(QWidget):
     def check_and_refresh_token(self):
         """トークンの有効性をチェックし、必要に応じて更新する"""
         if self.authenticator.get_access_token():
-            # トークンの有効性をチェック
-            user_info = self.spotify_client.get_current_user()
-            if not user_info:
+            # トークンの有効性をチェック（キャッシュされた 'me' では期限切れに気づけない）
+            if not self.spotify_client.verify_token():
                 # トークンが無効な場合、リフレッシュを試行
                 if self.authenticator.refresh_token():
                     print("トークンをリフレッシュしました")
@@ -596,7 +452,12 @@ class SwipeApp(QWidget):
     def show_current_song_info(self):
         """現在の楽曲の詳細情報を表示"""
         current_song = self.song_manager.get_current_song()
-        if current_song and hasattr(current_song, 'spotify_uri') and current_song.spotify_uri:
+        if current_song is None:
+            # 次のページを取得中（またはすべての曲をチェック済み）で、表示中の楽曲がない
+            if self.song_manager.has_next_song():
+                QMessageBox.information(self, "情報", "次の曲を探しています...")
+            return
+        if hasattr(current_song, 'spotify_uri') and current_song.spotify_uri:
             # Spotify URIがある場合、Spotifyアプリで開く
             try:
                 webbrowser.open(current_song.spotify_uri)
@@ -606,43 +467,27 @@ class SwipeApp(QWidget):
             QMessageBox.information(self, "情報", f"楽曲: {current_song.title}\nアーティスト: {current_song.artist}")
 
     def load_emotion_songs(self, emotion):
-        """選択された感情に基づいて楽曲を読み込み"""
-        try:
-            # プログレスダイアログの表示
-            progress = QProgressDialog("楽曲を検索中...", "キャンセル", 0, 0, self)
-            progress.setWindowModality(Qt.WindowModality.WindowModal)
-            progress.show()
-            
-            # 感情ベース楽曲を生成
-            self.emotion_song_manager.set_emotion_songs(emotion, limit=20)
-            
-            # 楽曲が見つかった場合、song_managerに設定
-            emotion_songs = self.emotion_song_manager.current_emotion_songs
-            if emotion_songs:
-                # 既存の楽曲リストを置き換え
-                self.song_manager.songs = emotion_songs
-                self.song_manager.current_index = 0
-                
-                # 画面を更新
-                self.load_current_song()
-                
-                description = self.emotion_song_manager.get_emotion_description(emotion)
-                QMessageBox.information(
-                    self,
-                    "楽曲読み込み完了",
-                    f"「{emotion}」の楽曲を{len(emotion_songs)}曲読み込みました。\n\n{description}"
-                )
-            else:
-                QMessageBox.warning(self, "エラー", "該当する楽曲が見つかりませんでした。")
-            
-            progress.close()
-            
-        except Exception as e:
-            QMessageBox.warning(self, "エラー", f"楽曲の読み込み中にエラーが発生しました: {str(e)}")
+        """選択された感情に基づいて楽曲を読み込み
 
+        楽曲はバックグラウンドで取得し、残りが少なくなるたびに続きを追加する。
+        """
+        # 楽曲リストを、感情ベースの楽曲を順次取得するデッキに置き換え
+        self.song_manager.set_producer(self.emotion_song_manager.song_producer(emotion, page_size=20))
+        
+        # 画面を更新（最初のページが届くまでは取得中の表示）
+        self.load_current_song()
+        
+        description = self.emotion_song_manager.get_emotion_description(emotion)
+        print(f"「{emotion}」の楽曲を読み込み中: {description}")
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    # 終了時に画像デコードの統計を表示
+    app.aboutToQuit.connect(lambda: print(ImageLoader.decode_stats.report()))
     window = SwipeApp()
+    # 終了時は作成中のジョブを止め、進捗が記録されるのを待つ（次回続きから再開できる）
+    app.aboutToQuit.connect(window.job_manager.cancel_all)
+    app.aboutToQuit.connect(lambda: window.job_manager.wait_for_done(5000))
+    app.aboutToQuit.connect(window.playlist_manager.close)
     window.show()
     sys.exit(app.exec())
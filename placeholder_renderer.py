@@ -0,0 +1,69 @@
+import re
+from urllib.parse import urlparse, parse_qs, quote
+from PyQt6.QtGui import QImage, QPainter, QColor, QFont
+from PyQt6.QtCore import Qt, QRectF
+
+
+# ローカルで描画するプレースホルダー画像のURLスキーム
+PLACEHOLDER_SCHEME = "placeholder"
+
+# 以前使っていた外部サービス（URLはローカル描画で置き換える）
+LEGACY_PLACEHOLDER_HOST = "via.placeholder.com"
+
+
+def placeholder_url(text, background="666666", foreground="white"):
+    """プレースホルダー画像のURLを作成（例: placeholder:4CAF50/white?text=Title）"""
+    return f"{PLACEHOLDER_SCHEME}:{background}/{foreground}?text={quote(text)}"
+
+
+def is_placeholder_url(url):
+    """ローカルで描画できるプレースホルダーURLかチェック"""
+    if not url:
+        return False
+    parsed = urlparse(url)
+    return parsed.scheme == PLACEHOLDER_SCHEME or parsed.hostname == LEGACY_PLACEHOLDER_HOST
+
+
+def parse_placeholder_url(url):
+    """プレースホルダーURLから (背景色, 文字色, テキスト) を取得"""
+    parsed = urlparse(url)
+    segments = [segment for segment in parsed.path.split("/") if segment]
+    if parsed.hostname == LEGACY_PLACEHOLDER_HOST and segments:
+        segments = segments[1:]  # 先頭はサイズ指定（250x250）
+
+    background = _to_color(segments[0] if len(segments) > 0 else "666666")
+    foreground = _to_color(segments[1] if len(segments) > 1 else "white")
+    text = parse_qs(parsed.query).get("text", [""])[0]
+    return background, foreground, text
+
+
+def _to_color(value):
+    """16進数の色指定または色名をQColorに変換"""
+    if re.fullmatch(r"[0-9a-fA-F]{3}|[0-9a-fA-F]{6}", value):
+        value = f"#{value}"
+    color = QColor(value)
+    return color if color.isValid() else QColor("#666666")
+
+
+def render_placeholder(url, size=(300, 300)):
+    """プレースホルダー画像をQPainterで描画してQImageを返す（ネットワーク不要）"""
+    background, foreground, text = parse_placeholder_url(url)
+
+    image = QImage(size[0], size[1], QImage.Format.Format_RGB32)
+    image.fill(background)
+
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+    font = QFont()
+    font.setPixelSize(max(10, min(size) // 10))
+    font.setBold(True)
+    painter.setFont(font)
+    painter.setPen(foreground)
+    margin = min(size) * 0.08
+    painter.drawText(
+        QRectF(margin, margin, size[0] - margin * 2, size[1] - margin * 2),
+        int(Qt.AlignmentFlag.AlignCenter | Qt.TextFlag.TextWordWrap),
+        text
+    )
+    painter.end()
+    return image
@@ -0,0 +1,126 @@
+from PyQt6.QtWidgets import QStyledItemDelegate, QStyleOptionViewItem
+from PyQt6.QtGui import QColor, QIcon, QPixmap
+from PyQt6.QtCore import QSize
+from image_loader import AsyncImageLoader, ImageLoader, THUMBNAIL_SIZES
+from playlist_model import SongRole
+from playlist_store import song_key
+
+# 一覧に表示するサムネイルの大きさ（論理ピクセル）
+THUMBNAIL_DISPLAY_SIZE = 40
+
+
+class PlaylistThumbnailDelegate(QStyledItemDelegate):
+    """プレイリストの各行にジャケットのサムネイルを表示するデリゲート
+
+    サムネイルは描画される行（画面に見えている行）の分だけ読み込む。
+    カード表示で読み込み済みの画像があればそれを使い、なければ
+    THUMBNAIL_SIZES[0] の大きさでワーカースレッドでデコードする。
+    読み込み前に画面外へスクロールした行のリクエストはキャンセルする。
+    """
+
+    def __init__(self, view, image_loader=None, parent=None):
+        super().__init__(parent)
+        self.view = view
+        self.thumbnail_size = THUMBNAIL_SIZES[0]
+        self.image_loader = image_loader or AsyncImageLoader(max_workers=2, parent=self)
+        self.image_loader.image_loaded.connect(self._on_image_loaded)
+
+        self._requests = {}      # 楽曲のキー -> 読み込み中のリクエストID
+        self._request_keys = {}  # リクエストID -> (楽曲のキー, URL)
+        self._failed_urls = set()
+
+        # 読み込み前の行に表示する空の枠
+        blank = QPixmap(*self.thumbnail_size)
+        blank.fill(QColor("#eeeeee"))
+        self._blank_icon = QIcon(blank)
+
+        view.verticalScrollBar().valueChanged.connect(self._cancel_offscreen_requests)
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        song = index.data(SongRole)
+        pixmap = self._cached_thumbnail(song) if song is not None else None
+        option.features |= QStyleOptionViewItem.ViewItemFeature.HasDecoration
+        option.decorationSize = QSize(THUMBNAIL_DISPLAY_SIZE, THUMBNAIL_DISPLAY_SIZE)
+        option.icon = QIcon(pixmap) if pixmap is not None else self._blank_icon
+
+    def paint(self, painter, option, index):
+        # 描画されるのは見えている行だけなので、ここで読み込みを始める
+        song = index.data(SongRole)
+        if song is not None:
+            self._request_thumbnail(song)
+        super().paint(painter, option, index)
+
+    def _candidate_urls(self, song):
+        """サムネイルに使える画像URL（カード表示用の画像を優先）"""
+        urls = []
+        for url in (ImageLoader.card_image_request(song, (300, 300), self.view.devicePixelRatioF())[0],
+                    song.image_url,
+                    ImageLoader.select_image_url(song, max(self.thumbnail_size))):
+            if url and url not in urls:
+                urls.append(url)
+        return urls
+
+    def _cached_thumbnail(self, song):
+        """メモリキャッシュ済みのサムネイル（なければNone）"""
+        for url in self._candidate_urls(song):
+            pixmap = ImageLoader.memory_cache.get(url, self.thumbnail_size)
+            if pixmap is not None:
+                return pixmap
+        return None
+
+    def _request_thumbnail(self, song):
+        key = song_key(song)
+        if key in self._requests:
+            return
+        urls = [url for url in self._candidate_urls(song) if url not in self._failed_urls]
+        if not urls:
+            return
+        # キャッシュ済み（プレースホルダーはその場で描画される）なら読み込まない
+        for url in urls:
+            if self.image_loader.get_cached(url, self.thumbnail_size) is not None:
+                return
+
+        # ディスクにある画像（カード表示で取得済み）ならダウンロードせずにデコードだけで済む
+        url = next((url for url in urls if ImageLoader.disk_cache.contains(url)), urls[-1])
+        request_id = self.image_loader.load(url, self.thumbnail_size)
+        self._requests[key] = request_id
+        self._request_keys[request_id] = (key, url)
+
+    def _visible_rows(self):
+        """見えている行の範囲 (最初, 最後)"""
+        viewport = self.view.viewport().rect()
+        model = self.view.model()
+        first = self.view.indexAt(viewport.topLeft())
+        last = self.view.indexAt(viewport.bottomLeft())
+        first_row = first.row() if first.isValid() else 0
+        last_row = last.row() if last.isValid() else model.rowCount() - 1
+        return first_row, last_row
+
+    def _cancel_offscreen_requests(self, *args):
+        """画面外にスクロールした行の読み込みをキャンセル"""
+        if not self._requests:
+            return
+        model = self.view.model()
+        first_row, last_row = self._visible_rows()
+        for key, request_id in list(self._requests.items()):
+            row = model.row_for_key(key)
+            if not first_row <= row <= last_row:
+                self.image_loader.cancel(request_id)
+                del self._requests[key]
+                del self._request_keys[request_id]
+
+    def _on_image_loaded(self, request_id, pixmap):
+        entry = self._request_keys.pop(request_id, None)
+        if entry is None:
+            return
+        key, url = entry
+        self._requests.pop(key, None)
+        if pixmap.isNull():
+            self._failed_urls.add(url)
+            return
+
+        model = self.view.model()
+        row = model.row_for_key(key)
+        if row >= 0:
+            self.view.update(model.index(row))
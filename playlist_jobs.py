@@ -0,0 +1,502 @@
+import time
+import threading
+from datetime import datetime
+from PyQt6.QtCore import QObject, QRunnable, QThread, QThreadPool, QTimer, pyqtSignal
+from track_resolver import TrackResolver
+from playlist_writer import WriteCheckpoint
+from job_journal import PlaylistJobJournal
+
+
+# ジョブの状態
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+# GUIに進捗を反映する間隔（ミリ秒）
+PROGRESS_FLUSH_INTERVAL_MS = 100
+
+
+class _PlaylistJobSignals(QObject):
+    """ワーカーからGUIスレッドへジョブの終了を届けるためのシグナル"""
+    finished = pyqtSignal(int, str, str)  # ジョブID, 終了状態, メッセージ
+
+
+class JobProgress:
+    """ワーカーで進捗イベントを集計し、GUIスレッドがまとめて読み出すためのクラス
+
+    曲ごとにシグナルを送るとイベントループが溢れるので、ワーカーは
+    record_*() でカウンターを進めるだけにし、GUIスレッドが一定間隔で
+    drain() して表示に反映する。カウンターは累計で、見つからなかった
+    楽曲は読み出されるまで溜めておくので取りこぼさない。
+    """
+
+    def __init__(self, total):
+        self._lock = threading.Lock()
+        self.total = total
+        self._processed = 0      # 検索済み曲数
+        self._not_found = 0      # 見つからなかった曲数
+        self._written = 0        # プレイリストに書き込んだ曲数
+        self._batches = 0        # 書き込んだバッチ数
+        self._phase = ""         # 現在の処理内容
+        self._new_failures = []  # 前回の drain() 以降に見つからなかった楽曲
+        self._version = 0
+
+    def resume_from(self, processed, not_found, written):
+        """前回の続きから再開するときのカウンターを設定"""
+        with self._lock:
+            self._processed = processed
+            self._not_found = not_found
+            self._written = written
+            self._version += 1
+
+    def set_phase(self, message):
+        with self._lock:
+            self._phase = message
+            self._version += 1
+
+    def record_resolved(self):
+        """1曲見つかった"""
+        with self._lock:
+            self._processed += 1
+            self._version += 1
+
+    def record_failed(self, song):
+        """1曲見つからなかった"""
+        with self._lock:
+            self._processed += 1
+            self._not_found += 1
+            self._new_failures.append(str(song))
+            self._version += 1
+
+    def record_batch_written(self, written_count):
+        """1バッチ書き込んだ（written_count は書き込み済みの累計）"""
+        with self._lock:
+            self._batches += 1
+            self._written = written_count
+            self._version += 1
+
+    def drain(self, last_version):
+        """last_version 以降に変化があれば (version, カウンター, 新しい失敗) を返す（なければNone）"""
+        with self._lock:
+            if self._version == last_version:
+                return None
+            counts = {
+                'processed': self._processed,
+                'not_found': self._not_found,
+                'written': self._written,
+                'batches': self._batches,
+                'phase': self._phase
+            }
+            failures, self._new_failures = self._new_failures, []
+            return self._version, counts, failures
+
+
+class PlaylistJobStatus:
+    """1ジョブ分の状態（GUIスレッドで更新する）"""
+
+    def __init__(self, job_id, playlist_name, total):
+        self.job_id = job_id
+        self.playlist_name = playlist_name
+        self.total = total
+        self.processed = 0
+        self.written = 0
+        self.failed_songs = []   # 見つからなかった楽曲（すべて保持する）
+        self.state = JOB_QUEUED
+        self.message = ""
+        self.progress_version = 0
+        self._rate_start = None  # (時刻, 検索済み曲数) 速度の計測開始点
+
+    @property
+    def is_active(self):
+        return self.state in (JOB_QUEUED, JOB_RUNNING)
+
+    def apply_progress(self, counts, failures):
+        """JobProgress.drain() の結果を反映"""
+        self.state = JOB_RUNNING
+        self.message = counts['phase']
+        if counts['processed'] and self._rate_start is None:
+            # 最初に届いた時点の曲数を起点にする（再開したジョブは前回の分を速度に含めない）
+            self._rate_start = (time.monotonic(), counts['processed'])
+        self.processed = counts['processed']
+        self.written = counts['written']
+        self.failed_songs.extend(failures)
+
+    def throughput(self):
+        """1秒あたりの検索済み曲数（計測できなければNone）"""
+        if self._rate_start is None:
+            return None
+        started_at, start_count = self._rate_start
+        elapsed = time.monotonic() - started_at
+        if elapsed < 0.5 or self.processed <= start_count:
+            return None
+        return (self.processed - start_count) / elapsed
+
+    def eta_seconds(self):
+        """残り時間の見積もり（秒、計測できなければNone）"""
+        rate = self.throughput()
+        if not rate:
+            return None
+        return max(0, self.total - self.processed) / rate
+
+    def summary_text(self):
+        """一覧に表示する1行の状態"""
+        name = f"「{self.playlist_name}」"
+        if self.state == JOB_QUEUED:
+            return f"{name} 待機中（{self.total}曲）"
+        if self.state == JOB_SUCCEEDED:
+            return f"{name} ✓ 完了"
+        if self.state in (JOB_FAILED, JOB_CANCELLED):
+            return f"{name} ✗ {self.message.splitlines()[0] if self.message else '失敗しました'}"
+        if self.processed == 0:
+            return f"{name} {self.message}"
+
+        text = f"{name} {self.processed}/{self.total}曲（追加済み {self.written}曲）"
+        rate = self.throughput()
+        if rate:
+            text += f"  {rate:.1f}曲/秒  残り約{int(self.eta_seconds() + 0.5)}秒"
+        return text
+
+
+class PlaylistCreationJob(QRunnable):
+    """プレイリストを作成して楽曲を追加するジョブ（ワーカースレッドで実行）
+
+    cancel() を呼ぶとリクエストの合間で処理を止める。journal を渡すと
+    進捗をディスクに記録し、同じ内容のジョブは続きから再開する。
+    """
+
+    # この件数を解決するごとに進捗を記録する（書き込み時にも記録する）
+    JOURNAL_INTERVAL = 20
+
+    def __init__(self, job_id, spotify_client, playlist_name, songs, is_public=False, journal=None, signals=None,
+                 job_key=None):
+        """songs は Song オブジェクト（または "タイトル - アーティスト" の文字列）のリスト
+
+        job_key を渡すと、その記録のジョブを続きから再開する（songs は記録の楽曲リストか、
+        その後ろに曲を足したもの）。
+        進捗は self.progress（JobProgress）に集計され、終了だけがシグナルで通知される。
+        """
+        super().__init__()
+        self.setAutoDelete(False)
+        self.job_id = job_id
+        self.spotify_client = spotify_client
+        self.playlist_name = playlist_name
+        self.songs = songs
+        self.is_public = is_public
+        self.journal = journal
+        self.job_key = job_key or PlaylistJobJournal.job_key(playlist_name, songs)
+        self.progress = JobProgress(len(songs))
+        self._signals = signals or _PlaylistJobSignals()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """処理の中止を要求（実行中のリクエストが終わった時点で止まる）"""
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self):
+        # スワイプ操作の描画を妨げないよう、ワーカースレッドの優先度を下げる
+        QThread.currentThread().setPriority(QThread.Priority.LowPriority)
+        # まとめ処理なので、スワイプ中の対話的なリクエストを優先させる
+        with self.spotify_client.bulk_priority():
+            self._create_playlist()
+
+    def _finish(self, state, message):
+        self._signals.finished.emit(self.job_id, state, message)
+
+    def _save_state(self, state):
+        if self.journal is not None:
+            self.journal.save(state)
+
+    def _finish_cancelled(self, state):
+        self._save_state(state)
+        message = "プレイリストの作成をキャンセルしました"
+        if self.journal is not None and state["playlist_id"]:
+            message += "\n次にプレイリストを作成するときに続きから再開できます"
+        self._finish(JOB_CANCELLED, message)
+
+    def _finish_failed(self, state, message):
+        self._save_state(state)
+        self._finish(JOB_FAILED, message)
+
+    def _create_playlist(self):
+        """プレイリストを作成して楽曲を追加"""
+        state = self.journal.load(self.job_key) if self.journal is not None else None
+        if state is None:
+            state = PlaylistJobJournal.new_state(self.job_key, self.playlist_name, self.songs, self.is_public)
+        else:
+            # 再開時に後ろへ足された楽曲も記録する
+            state["songs"] = [PlaylistJobJournal.song_entry(song) for song in self.songs]
+
+        try:
+            playlist_id = state["playlist_id"]
+            if playlist_id:
+                # 前回作成したプレイリストを使って続きから再開する
+                self.progress.set_phase(
+                    f"前回の続きから再開します（{len(state['resolved'])}/{len(self.songs)}曲 検索済み）"
+                )
+            else:
+                # ユーザー情報を取得
+                self.progress.set_phase("ユーザー情報を取得中...")
+                user_info = self.spotify_client.get_current_user()
+                if not user_info:
+                    self._finish(JOB_FAILED, "ユーザー情報の取得に失敗しました")
+                    return
+                if self.is_cancelled():
+                    self._finish(JOB_CANCELLED, "プレイリストの作成をキャンセルしました")
+                    return
+
+                user_id = user_info.get("id")
+                self.progress.set_phase(f"ユーザー: {user_info.get('display_name', user_id)}")
+
+                # プレイリストを作成
+                self.progress.set_phase("プレイリストを作成中...")
+                playlist_description = f"MEET une アプリで作成 - {datetime.now().strftime('%Y年%m月%d日')}"
+                playlist_info = self.spotify_client.create_playlist(
+                    user_id,
+                    self.playlist_name,
+                    playlist_description,
+                    self.is_public
+                )
+
+                if not playlist_info:
+                    self._finish(JOB_FAILED, "プレイリストの作成に失敗しました")
+                    return
+
+                playlist_id = playlist_info.get("id")
+                state["playlist_id"] = playlist_id
+                self._save_state(state)
+                self.progress.set_phase(f"プレイリスト「{self.playlist_name}」を作成しました")
+
+            # 書き込み済みのバッチは記録されたチェックポイントから読み飛ばす
+            writer = self.spotify_client.playlist_writer
+            if state["checkpoint"]:
+                checkpoint = WriteCheckpoint.from_dict(state["checkpoint"])
+            else:
+                checkpoint = WriteCheckpoint(playlist_id, base_position=0)
+
+            def on_batch_written(checkpoint):
+                self.progress.record_batch_written(checkpoint.written_count)
+                state["checkpoint"] = checkpoint.to_dict()
+                self._save_state(state)
+
+            session = writer.open_session(playlist_id, checkpoint, on_batch_written=on_batch_written)
+
+            # 解決済みの楽曲は検索し直さない（書き込み済みの分はセッションが読み飛ばす）
+            resolved = state["resolved"]
+            self.progress.resume_from(len(resolved), resolved.count(None), checkpoint.written_count)
+            if not session.append([uri for uri in resolved if uri]):
+                self._finish_failed(state, f"楽曲の追加に失敗しました (バッチ {session.checkpoint.batches_written + 1})")
+                return
+
+            # 残りの楽曲を並列に検索してURIを取得し、見つかった順（入力順）に100曲ずつ追加していく
+            resolver = TrackResolver(self.spotify_client)
+            remaining = self.songs[len(resolved):]
+            resolutions = resolver.resolve_in_order(remaining)
+            try:
+                for resolution in resolutions:
+                    if self.is_cancelled():
+                        self._finish_cancelled(state)
+                        return
+
+                    song = resolution.song
+                    resolved.append(resolution.uri)
+
+                    if resolution.uri:
+                        self.progress.record_resolved()
+                        # 100曲たまったら検索を続けながら書き込む
+                        if not session.append(resolution.uri):
+                            self._finish_failed(state, f"楽曲の追加に失敗しました (バッチ {session.checkpoint.batches_written + 1})")
+                            return
+                    else:
+                        self.progress.record_failed(song)
+
+                    if len(resolved) % self.JOURNAL_INTERVAL == 0:
+                        self._save_state(state)
+            finally:
+                resolutions.close()
+
+            if self.is_cancelled():
+                self._finish_cancelled(state)
+                return
+
+            track_uris = [uri for uri in resolved if uri]
+            failed_tracks = [str(song) for song, uri in zip(self.songs, resolved) if not uri]
+
+            # 残りの楽曲をプレイリストに追加
+            if track_uris:
+                self.progress.set_phase("楽曲をプレイリストに追加中...")
+
+                if not session.flush():
+                    self._finish_failed(state, f"楽曲の追加に失敗しました (バッチ {session.checkpoint.batches_written + 1})")
+                    return
+
+                if self.journal is not None:
+                    self.journal.remove(self.job_key)
+
+                success_count = len(track_uris)
+                failed_count = len(failed_tracks)
+
+                success_message = f"プレイリスト「{self.playlist_name}」を作成しました！\n\n"
+                success_message += f"✓ 追加された楽曲: {success_count}曲\n"
+                if failed_count > 0:
+                    success_message += f"✗ 見つからなかった楽曲: {failed_count}曲\n"
+                    success_message += f"見つからなかった楽曲: {', '.join(failed_tracks[:3])}"
+                    if len(failed_tracks) > 3:
+                        success_message += f" など{len(failed_tracks)}曲"
+
+                success_message += f"\n\nSpotifyアプリでプレイリストを確認できます。"
+
+                self._finish(JOB_SUCCEEDED, success_message)
+            else:
+                if self.journal is not None:
+                    self.journal.remove(self.job_key)
+                self._finish(JOB_FAILED, "追加できる楽曲が見つかりませんでした")
+
+        except Exception as e:
+            self._finish_failed(state, f"エラーが発生しました: {str(e)}")
+
+
+class PlaylistJobManager(QObject):
+    """プレイリスト作成ジョブをバックグラウンドで実行するクラス
+
+    ジョブは共有のスレッドプールで実行し、同時に実行するのは
+    max_concurrent_jobs 件まで（残りは待機する）。各ジョブの進捗は
+    PROGRESS_FLUSH_INTERVAL_MS ごとにまとめて読み出し、変化したジョブだけ
+    job_updated で状態・速度・残り時間を通知する。
+    """
+
+    job_added = pyqtSignal(int, str)           # ジョブID, 状態の表示テキスト
+    job_updated = pyqtSignal(int, str)         # ジョブID, 状態の表示テキスト
+    job_finished = pyqtSignal(int, bool, str)  # ジョブID, 成功したか, メッセージ
+
+    def __init__(self, spotify_client, journal=None, max_concurrent_jobs=2, parent=None):
+        super().__init__(parent)
+        self.spotify_client = spotify_client
+        self.journal = journal
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max_concurrent_jobs)
+
+        self._next_job_id = 0
+        self._jobs = {}      # ジョブID -> 実行中・待機中の PlaylistCreationJob
+        self._statuses = {}  # ジョブID -> PlaylistJobStatus
+
+        self._signals = _PlaylistJobSignals()
+        self._signals.finished.connect(self._on_finished)
+
+        # ジョブがある間だけ動かす進捗の反映タイマー
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setInterval(PROGRESS_FLUSH_INTERVAL_MS)
+        self._flush_timer.timeout.connect(self._flush_progress)
+
+    def submit(self, playlist_name, songs, is_public=False):
+        """ジョブを追加してジョブIDを返す（同じ内容のジョブを実行中ならNone）"""
+        job_key = PlaylistJobJournal.job_key(playlist_name, songs)
+        return self._start(job_key, playlist_name, list(songs), is_public)
+
+    def pending_jobs(self):
+        """中断されたまま実行されていないジョブの記録（更新が新しい順）"""
+        if self.journal is None:
+            return []
+        active_keys = {job.job_key for job in self._jobs.values()}
+        return [state for state in self.journal.pending_jobs()
+                if state.get("playlist_id") and state["job_key"] not in active_keys]
+
+    def resume(self, state, songs=None):
+        """記録されたジョブを続きから再開してジョブIDを返す
+
+        songs が記録の楽曲リストの後ろに曲を足したものなら、足された曲も追加する。
+        それ以外は記録された楽曲リストのまま再開する。
+        """
+        if songs is None or not PlaylistJobJournal.extends(state, songs):
+            songs = PlaylistJobJournal.songs_from_state(state)
+        return self._start(state["job_key"], state["playlist_name"], list(songs), state.get("is_public", False))
+
+    def discard(self, state):
+        """再開しないジョブの記録を削除"""
+        if self.journal is not None:
+            self.journal.remove(state["job_key"])
+
+    def _start(self, job_key, playlist_name, songs, is_public):
+        if any(job.job_key == job_key for job in self._jobs.values()):
+            print(f"同じ内容のプレイリストを作成中です: {playlist_name}")
+            return None
+
+        self._next_job_id += 1
+        job_id = self._next_job_id
+        job = PlaylistCreationJob(
+            job_id, self.spotify_client, playlist_name, songs,
+            is_public, journal=self.journal, signals=self._signals, job_key=job_key
+        )
+        status = PlaylistJobStatus(job_id, playlist_name, len(songs))
+        self._jobs[job_id] = job
+        self._statuses[job_id] = status
+
+        self.job_added.emit(job_id, status.summary_text())
+        self.thread_pool.start(job)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+        return job_id
+
+    def cancel(self, job_id):
+        """ジョブを中止（待機中なら実行せずに取り除く）"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        if self.thread_pool.tryTake(job):
+            self._on_finished(job_id, JOB_CANCELLED, "プレイリストの作成をキャンセルしました")
+        else:
+            job.cancel()
+
+    def cancel_all(self):
+        """すべてのジョブを中止"""
+        for job_id in list(self._jobs):
+            self.cancel(job_id)
+
+    def wait_for_done(self, msecs=-1):
+        """実行中のジョブの終了を待つ（アプリ終了時用）"""
+        return self.thread_pool.waitForDone(msecs)
+
+    def status(self, job_id):
+        return self._statuses.get(job_id)
+
+    def active_count(self):
+        """実行中・待機中のジョブ数"""
+        return len(self._jobs)
+
+    def _flush_progress(self):
+        """各ジョブの集計済みの進捗を表示に反映"""
+        for job_id in list(self._jobs):
+            if self._apply_progress(job_id):
+                self.job_updated.emit(job_id, self._statuses[job_id].summary_text())
+
+    def _apply_progress(self, job_id):
+        """前回から進捗が変化していれば状態に反映してTrueを返す"""
+        job = self._jobs.get(job_id)
+        status = self._statuses.get(job_id)
+        if job is None or status is None:
+            return False
+        drained = job.progress.drain(status.progress_version)
+        if drained is None:
+            return False
+        status.progress_version, counts, failures = drained
+        status.apply_progress(counts, failures)
+        return True
+
+    def _on_finished(self, job_id, state, message):
+        status = self._statuses.get(job_id)
+        if status is None or not status.is_active:
+            return
+        # 最後の進捗を取りこぼさないよう、終了を反映する前に読み出す
+        self._apply_progress(job_id)
+        status.state = state
+        status.message = message
+        self._jobs.pop(job_id, None)
+        if not self._jobs:
+            self._flush_timer.stop()
+        self.job_updated.emit(job_id, status.summary_text())
+        self.job_finished.emit(job_id, state == JOB_SUCCEEDED, message)
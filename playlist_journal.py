@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import queue
+import threading
+from song import Song, intern_song
+from playlist_store import PlaylistStore
+
+
+class PlaylistJournal:
+    """プレイリストの操作（追加・削除・移動・クリア）をディスクに追記するジャーナル
+
+    操作は1行1件のJSONとしてログに追記する。書き込みは専用スレッドが
+    まとめて行い、sync_interval の間に届いた操作は1回の fsync で確定させる
+    ので、呼び出し側（GUIスレッド）は待たされない。ログが compact_threshold
+    件を超えたら、その時点の全曲をスナップショットに書き出してログを空にする。
+    起動時はスナップショットを読み、そのあとのログだけを再生する。
+    """
+
+    SNAPSHOT_NAME = "playlist.snapshot.json"
+    LOG_NAME = "playlist.log"
+
+    def __init__(self, directory=None, sync_interval=0.05, compact_threshold=1000):
+        self.directory = directory or os.path.join(os.path.expanduser("~"), ".cache", "meetune", "playlist")
+        self.sync_interval = sync_interval
+        self.compact_threshold = compact_threshold
+        self._snapshot_path = os.path.join(self.directory, self.SNAPSHOT_NAME)
+        self._log_path = os.path.join(self.directory, self.LOG_NAME)
+        self._queue = queue.Queue()
+        self._state = PlaylistStore()  # 書き込みスレッドが持つ現在の状態（スナップショット用）
+        self._seq = 0                  # 最後に採番した操作の番号
+        self._log_records = 0          # スナップショット以降にログにある操作の数
+        self._log_file = None
+        self._thread = None
+
+    def load(self):
+        """保存されている楽曲を順番どおりに読み込み、記録を開始する"""
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_seq = self._load_snapshot()
+        self._replay_log(snapshot_seq)
+        self._log_file = open(self._log_path, "ab")
+        self._thread = threading.Thread(target=self._run, name="PlaylistJournal", daemon=True)
+        self._thread.start()
+        return list(self._state.songs())
+
+    def record_add(self, song):
+        self._enqueue({"op": "add", "song": song})
+
+    def record_remove(self, key):
+        self._enqueue({"op": "remove", "key": key})
+
+    def record_move(self, key, index):
+        self._enqueue({"op": "move", "key": key, "index": index})
+
+    def record_clear(self):
+        self._enqueue({"op": "clear"})
+
+    def flush(self):
+        """記録待ちの操作がすべてディスクに書かれるまで待つ"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """残りの操作を書き込んで記録を終了"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._log_file.close()
+
+    def _enqueue(self, record):
+        if self._thread is None:
+            return
+        self._queue.put(record)
+
+    def _load_snapshot(self):
+        """スナップショットを読み込み、含まれている最後の操作番号を返す"""
+        try:
+            with open(self._snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            print(f"プレイリストのスナップショット読み込みエラー: {e}")
+            return 0
+
+        for data in snapshot.get("songs", []):
+            self._state.add(intern_song(Song.from_dict(data)))
+        self._seq = snapshot.get("seq", 0)
+        return self._seq
+
+    def _replay_log(self, snapshot_seq):
+        """スナップショット以降の操作を再生（途中で壊れた行があればそこで切り詰める）"""
+        try:
+            with open(self._log_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        valid_bytes = 0
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # 書き込み途中で落ちた行
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            valid_bytes += len(line)
+            self._log_records += 1
+            if record.get("seq", 0) <= snapshot_seq:
+                continue  # スナップショットに反映済み
+            self._seq = record["seq"]
+            self._apply(record, lambda data: intern_song(Song.from_dict(data)))
+
+        if valid_bytes < len(data):
+            print("プレイリストの記録の末尾が壊れていたため切り詰めました")
+            with open(self._log_path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+    def _apply(self, record, make_song):
+        op = record["op"]
+        if op == "add":
+            self._state.add(make_song(record["song"]))
+        elif op == "remove":
+            self._state.remove(record["key"])
+        elif op == "move":
+            self._state.move(record["key"], record["index"])
+        elif op == "clear":
+            self._state.clear()
+
+    def _run(self):
+        """書き込みスレッド：届いた操作をまとめて書き込み、1回だけ fsync する"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.sync_interval
+            while batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not None]
+            try:
+                self._write(records)
+            except Exception as e:
+                print(f"プレイリストの記録の書き込みエラー: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if batch[-1] is None:
+                return
+
+    def _write(self, records):
+        if not records:
+            return
+        lines = []
+        for record in records:
+            self._seq += 1
+            record["seq"] = self._seq
+            self._apply(record, lambda song: song)
+            if record["op"] == "add":
+                record = dict(record, song=record["song"].to_dict())
+            lines.append(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._log_file.write(b"".join(lines))
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+        self._log_records += len(records)
+
+        if self._log_records >= self.compact_threshold:
+            self._compact()
+
+    def _compact(self):
+        """現在の状態をスナップショットに書き出し、ログを空にする"""
+        snapshot = {"seq": self._seq, "songs": [song.to_dict() for song in self._state.songs()]}
+        tmp_path = f"{self._snapshot_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+
+        # ここで落ちてもログの操作はスナップショットの seq 以下なので再生時に読み飛ばされる
+        self._log_file.close()
+        self._log_file = open(self._log_path, "wb")
+        os.fsync(self._log_file.fileno())
+        self._log_records = 0
@@ -1,48 +1,68 @@
+from playlist_store import PlaylistStore, song_key
+
+
 class PlaylistManager:
     """プレイリスト管理クラス"""
     
-    def __init__(self):
-        self.songs = []  # 楽曲リスト
-        self.song_ids = set()  # 重複チェック用のセット
-        self.count = 0  # 楽曲数
+    def __init__(self, journal=None):
+        self.store = PlaylistStore()  # 順序付きでキーから引ける楽曲の格納先
+        
+        # journal（PlaylistJournal）があれば前回の楽曲を復元し、以降の操作を記録する
+        self.journal = journal
+        if journal is not None:
+            self.store.extend(journal.load())
+    
+    @property
+    def count(self):
+        """楽曲数"""
+        return len(self.store)
+    
+    @property
+    def version(self):
+        """変更のたびに増える番号（表示側が古くなったかの判定に使う）"""
+        return self.store.version
     
     def add_song(self, song):
         """楽曲をプレイリストに追加"""
-        # 楽曲のユニークIDを生成（タイトル + アーティスト）
-        song_id = f"{song.title}_{song.artist}"
-        
-        # 重複チェック
-        if song_id in self.song_ids:
+        # 重複チェック（タイトル + アーティストが同じ楽曲は追加しない）
+        if not self.store.add(song):
             return False  # 既に追加済み
-        
-        # 楽曲を追加
-        self.songs.append(song)
-        self.song_ids.add(song_id)
-        self.count += 1
+        if self.journal is not None:
+            self.journal.record_add(song)
         
         print(f"プレイリストに追加: {song.title} - {song.artist}")
         return True
     
     def remove_song(self, song):
         """楽曲をプレイリストから削除"""
-        song_id = f"{song.title}_{song.artist}"
-        
-        if song_id in self.song_ids:
-            self.songs.remove(song)
-            self.song_ids.remove(song_id)
-            self.count -= 1
-            print(f"プレイリストから削除: {song.title} - {song.artist}")
-            return True
-        return False
+        key = song_key(song)
+        if self.store.remove(key) is None:
+            return False
+        if self.journal is not None:
+            self.journal.record_remove(key)
+        print(f"プレイリストから削除: {song.title} - {song.artist}")
+        return True
+    
+    def move_song(self, song, new_index):
+        """楽曲を new_index の位置へ移動"""
+        key = song_key(song)
+        if not self.store.move(key, new_index):
+            return False
+        if self.journal is not None:
+            self.journal.record_move(key, new_index)
+        return True
+    
+    def index_of(self, song):
+        """楽曲の位置（含まれていなければ-1）"""
+        return self.store.index_of(song_key(song))
     
     def get_songs(self):
-        """プレイリストの楽曲リストを取得"""
-        # 楽曲オブジェクトのリストを文字列のリストに変換
-        return [f"{song.title} - {song.artist}" for song in self.songs]
+        """プレイリストの楽曲リストを取得（"タイトル - アーティスト" の読み取り専用の一覧）"""
+        return self.store.labels()
     
     def get_song_objects(self):
-        """プレイリストの楽曲オブジェクトリストを取得"""
-        return self.songs.copy()
+        """プレイリストの楽曲オブジェクトリストを取得（読み取り専用、変更があるまで同じものを返す）"""
+        return self.store.songs()
     
     def get_count(self):
         """プレイリストの楽曲数を取得"""
@@ -50,19 +70,23 @@ class PlaylistManager:
     
     def clear_playlist(self):
         """プレイリストをクリア"""
-        self.songs.clear()
-        self.song_ids.clear()
-        self.count = 0
+        self.store.clear()
+        if self.journal is not None:
+            self.journal.record_clear()
         print("プレイリストをクリアしました")
     
+    def close(self):
+        """記録待ちの操作を書き込んで記録を終了"""
+        if self.journal is not None:
+            self.journal.close()
+    
     def is_empty(self):
         """プレイリストが空かどうかを確認"""
         return self.count == 0
     
     def contains_song(self, song):
         """特定の楽曲がプレイリストに含まれているかチェック"""
-        song_id = f"{song.title}_{song.artist}"
-        return song_id in self.song_ids
+        return song_key(song) in self.store
     
     def get_playlist_info(self):
         """プレイリストの情報を取得"""
@@ -0,0 +1,70 @@
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex
+from playlist_store import song_key
+
+
+# Song オブジェクトを取り出すためのロール
+SongRole = Qt.ItemDataRole.UserRole
+
+
+class PlaylistListModel(QAbstractListModel):
+    """PlaylistStore をそのまま表示するリストモデル
+
+    行のデータは表示されるときに store から取り出すので、楽曲ごとの
+    アイテムを持たない。store の変更通知をそのままQtの行の挿入・削除・
+    移動に変換するため、まとめて追加された楽曲は1回の挿入として扱われる。
+    """
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        store.add_observer(self)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.store)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.store):
+            return None
+        song = self.store.song_at(index.row())
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"♪ {song.title} - {song.artist}"
+        if role == SongRole:
+            return song
+        return None
+
+    def row_for_key(self, key):
+        """キーの楽曲の行（なければ-1）"""
+        return self.store.index_of(key)
+
+    def index_for_song(self, song):
+        """楽曲の QModelIndex（なければ無効なインデックス）"""
+        row = self.row_for_key(song_key(song))
+        return self.index(row) if row >= 0 else QModelIndex()
+
+    # PlaylistStore からの変更通知
+
+    def begin_insert(self, first, last):
+        self.beginInsertRows(QModelIndex(), first, last)
+
+    def end_insert(self):
+        self.endInsertRows()
+
+    def begin_remove(self, first, last):
+        self.beginRemoveRows(QModelIndex(), first, last)
+
+    def end_remove(self):
+        self.endRemoveRows()
+
+    def begin_move(self, source, destination):
+        self.beginMoveRows(QModelIndex(), source, source, QModelIndex(), destination)
+
+    def end_move(self):
+        self.endMoveRows()
+
+    def begin_reset(self):
+        self.beginResetModel()
+
+    def end_reset(self):
+        self.endResetModel()
@@ -0,0 +1,239 @@
+from bisect import bisect_right
+
+
+def song_key(song):
+    """楽曲のユニークID（タイトル + アーティスト）"""
+    return f"{song.title}_{song.artist}"
+
+
+class PlaylistStore:
+    """順序付きでキーから引けるプレイリストの格納先
+
+    キーの列を最大 2 * BLOCK_SIZE 件のブロックに分けて持つ（平方分割）。
+    - キーでの追加（末尾）・存在確認は O(1)、削除はブロック内の探索のみ
+    - 位置での参照・挿入・移動はブロックの先頭位置を二分探索して O(log n + ブロックサイズ)
+    - songs() / keys() / labels() の結果は変更があるまで使い回す
+    変更のたびに version が増えるので、読み出し側は古くなったかを判定できる。
+
+    add_observer() で登録したオブジェクトには、Qtのモデルと同じく変更の前後に
+    begin_insert(first, last) / end_insert()、begin_remove(first, last) / end_remove()、
+    begin_move(source, destination) / end_move()、begin_reset() / end_reset() が呼ばれる。
+    """
+
+    BLOCK_SIZE = 512
+
+    def __init__(self, songs=None):
+        self._songs = {}       # キー -> Song
+        self._block_of = {}    # キー -> そのキーが入っているブロック
+        self._blocks = [[]]    # キーのブロックのリスト（順序どおり）
+        self._offsets = None   # 各ブロックの先頭位置（ブロックの構成が変わると作り直す）
+        self._block_index = None  # id(ブロック) -> ブロック番号
+        self._views = {}       # ビューの種類 -> 作成時の version と内容
+        self._observers = []
+        self.version = 0
+        for song in songs or ():
+            self.add(song)
+
+    def __len__(self):
+        return len(self._songs)
+
+    def __contains__(self, key):
+        return key in self._songs
+
+    def __iter__(self):
+        return iter(self.songs())
+
+    def add_observer(self, observer):
+        """変更の通知先を登録"""
+        self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        """変更の通知先を解除"""
+        if observer in self._observers:
+            self._observers.remove(observer)
+
+    def get(self, key):
+        """キーの楽曲（なければNone）"""
+        return self._songs.get(key)
+
+    def add(self, song):
+        """末尾に追加（既に含まれていればFalse）"""
+        return self.extend([song]) == 1
+
+    def extend(self, songs):
+        """まとめて末尾に追加し、追加した曲数を返す（含まれている楽曲は飛ばす）"""
+        new_items = {}
+        for song in songs:
+            key = song_key(song)
+            if key not in self._songs and key not in new_items:
+                new_items[key] = song
+        if not new_items:
+            return 0
+
+        first = len(self._songs)
+        self._notify('begin_insert', first, first + len(new_items) - 1)
+        for key, song in new_items.items():
+            block = self._blocks[-1]
+            block.append(key)
+            self._songs[key] = song
+            self._block_of[key] = block
+            if len(block) >= 2 * self.BLOCK_SIZE:
+                self._split(len(self._blocks) - 1)
+        # 末尾のブロックへの追加ではどのブロックの先頭位置も変わらない
+        self._changed(structure=False)
+        self._notify('end_insert')
+        return len(new_items)
+
+    def insert(self, index, song):
+        """index の位置に挿入（既に含まれていればFalse）"""
+        key = song_key(song)
+        if key in self._songs:
+            return False
+        index = max(0, min(index, len(self._songs)))
+        if index == len(self._songs):
+            return self.add(song)
+        self._notify('begin_insert', index, index)
+        self._insert_key(index, key, song)
+        self._changed()
+        self._notify('end_insert')
+        return True
+
+    def remove(self, key):
+        """キーの楽曲を削除して返す（なければNone）"""
+        if key not in self._songs:
+            return None
+        if self._observers:
+            index = self.index_of(key)
+            self._notify('begin_remove', index, index)
+        song = self._remove_key(key)
+        self._changed()
+        self._notify('end_remove')
+        return song
+
+    def move(self, key, new_index):
+        """キーの楽曲を new_index の位置へ移動（なければFalse）"""
+        if key not in self._songs:
+            return False
+        new_index = max(0, min(new_index, len(self._songs) - 1))
+        old_index = self.index_of(key)
+        if old_index == new_index:
+            return True
+        # Qtの移動先は「移動前の並びでどの行の前に入れるか」で表す
+        self._notify('begin_move', old_index, new_index + 1 if new_index > old_index else new_index)
+        song = self._remove_key(key)
+        self._changed()
+        self._insert_key(new_index, key, song)
+        self._changed()
+        self._notify('end_move')
+        return True
+
+    def clear(self):
+        """すべて削除"""
+        self._notify('begin_reset')
+        self._songs.clear()
+        self._block_of.clear()
+        self._blocks = [[]]
+        self._changed()
+        self._notify('end_reset')
+
+    def index_of(self, key):
+        """キーの楽曲の位置（なければ-1）"""
+        block = self._block_of.get(key)
+        if block is None:
+            return -1
+        self._ensure_index()
+        block_no = self._block_index[id(block)]
+        return self._offsets[block_no] + block.index(key)
+
+    def key_at(self, index):
+        """位置のキー"""
+        if not 0 <= index < len(self._songs):
+            raise IndexError("playlist index out of range")
+        block_no, offset = self._locate(index)
+        return self._blocks[block_no][offset]
+
+    def song_at(self, index):
+        """位置の楽曲"""
+        return self._songs[self.key_at(index)]
+
+    def keys(self):
+        """キーの一覧（読み取り専用、変更があるまで使い回す）"""
+        return self._view('keys', lambda: tuple(key for block in self._blocks for key in block))
+
+    def songs(self):
+        """楽曲の一覧（読み取り専用、変更があるまで使い回す）"""
+        return self._view('songs', lambda: tuple(self._songs[key] for key in self.keys()))
+
+    def labels(self):
+        """"タイトル - アーティスト" の一覧（読み取り専用、変更があるまで使い回す）"""
+        return self._view('labels', lambda: tuple(f"{song.title} - {song.artist}" for song in self.songs()))
+
+    def _view(self, name, build):
+        cached = self._views.get(name)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        value = build()
+        self._views[name] = (self.version, value)
+        return value
+
+    def _locate(self, index):
+        """位置を (ブロック番号, ブロック内の位置) に変換"""
+        self._ensure_index()
+        block_no = bisect_right(self._offsets, index) - 1
+        return block_no, index - self._offsets[block_no]
+
+    def _insert_key(self, index, key, song):
+        if index == len(self._songs):
+            block_no = len(self._blocks) - 1
+            offset = len(self._blocks[-1])
+        else:
+            block_no, offset = self._locate(index)
+        block = self._blocks[block_no]
+        block.insert(offset, key)
+        self._songs[key] = song
+        self._block_of[key] = block
+        if len(block) >= 2 * self.BLOCK_SIZE:
+            self._split(block_no)
+
+    def _remove_key(self, key):
+        song = self._songs.pop(key)
+        block = self._block_of.pop(key)
+        block.remove(key)
+        if not block and len(self._blocks) > 1:
+            self._ensure_index()
+            del self._blocks[self._block_index[id(block)]]
+        return song
+
+    def _notify(self, event, *args):
+        for observer in self._observers:
+            getattr(observer, event)(*args)
+
+    def _split(self, block_no):
+        """大きくなりすぎたブロックを半分に分ける"""
+        block = self._blocks[block_no]
+        half = len(block) // 2
+        new_block = block[half:]
+        del block[half:]
+        for key in new_block:
+            self._block_of[key] = new_block
+        self._blocks.insert(block_no + 1, new_block)
+        self._offsets = None
+        self._block_index = None
+
+    def _ensure_index(self):
+        if self._offsets is not None:
+            return
+        offsets = []
+        total = 0
+        for block in self._blocks:
+            offsets.append(total)
+            total += len(block)
+        self._offsets = offsets
+        self._block_index = {id(block): block_no for block_no, block in enumerate(self._blocks)}
+
+    def _changed(self, structure=True):
+        self.version += 1
+        if structure:
+            # 途中のブロックが変わると後ろのブロックの先頭位置がずれる
+            self._offsets = None
+            self._block_index = None
@@ -1,14 +1,53 @@
-from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout, QListWidget, QListWidgetItem
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QListView, QPushButton
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from playlist_store import PlaylistStore
+from playlist_model import PlaylistListModel
+from playlist_delegate import PlaylistThumbnailDelegate
+
+# Spotify連携ボタンのスタイル（楽曲があるとき / 空のとき）
+SPOTIFY_BUTTON_ENABLED_STYLE = """
+    background-color: #1DB954;
+    color: white;
+    padding: 15px;
+    border-radius: 8px;
+    font-weight: bold;
+    margin-top: 10px;
+    cursor: pointer;
+"""
+SPOTIFY_BUTTON_DISABLED_STYLE = """
+    background-color: #cccccc;
+    color: #666666;
+    padding: 15px;
+    border-radius: 8px;
+    font-weight: bold;
+    margin-top: 10px;
+    cursor: not-allowed;
+"""
 
 class PlaylistWidget(QWidget):
-    """プレイリスト表示ウィジェット"""
+    """プレイリスト表示ウィジェット
+    
+    楽曲は PlaylistStore を直接表示するモデル（PlaylistListModel）経由で
+    QListView に表示するので、store を共有すれば変更は自動的に反映される。
+    楽曲の追加・削除は PlaylistManager 経由で行う（記録がジャーナルに残るように）。
+    各行のジャケットは PlaylistThumbnailDelegate が見えている行の分だけ読み込む。
+    """
     
     # シグナル定義
     create_spotify_playlist = pyqtSignal()
+    cancel_job_requested = pyqtSignal(int)  # ジョブID
+    
+    # 成功したジョブの表示を消すまでの時間（ミリ秒）
+    FINISHED_JOB_DISPLAY_MS = 10000
     
-    def __init__(self):
+    def __init__(self, store=None, image_loader=None):
         super().__init__()
+        # 表示する楽曲（PlaylistManager と共有する。省略時はこのウィジェット専用）
+        self.store = store if store is not None else PlaylistStore()
+        # サムネイルの読み込みに使う AsyncImageLoader（省略時はデリゲート専用のもの）
+        self.image_loader = image_loader
+        self._job_rows = {}  # ジョブID -> (行ウィジェット, ラベル, ボタン, 終了したか)
+        self._is_empty = None  # ボタンのスタイルを最後に設定したときに空だったか
         self.init_ui()
     
     def init_ui(self):
@@ -22,113 +61,139 @@ class PlaylistWidget(QWidget):
         self.count_label = QLabel("楽曲数: 0")
         self.count_label.setStyleSheet("font-size: 12px; color: #666; margin-bottom: 10px;")
         
-        # プレイリスト表示
-        self.list_widget = QListWidget()
-        self.list_widget.setStyleSheet("""
-            QListWidget {
+        # プレイリスト表示（行の高さをそろえて、見えている行だけを描画させる）
+        self.model = PlaylistListModel(self.store, self)
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setUniformItemSizes(True)
+        # 見えている行だけサムネイルを読み込む
+        self.thumbnail_delegate = PlaylistThumbnailDelegate(self.list_view, self.image_loader, self)
+        self.list_view.setItemDelegate(self.thumbnail_delegate)
+        self.list_view.setStyleSheet("""
+            QListView {
                 border: 1px solid #ddd;
                 border-radius: 5px;
                 background-color: white;
                 alternate-background-color: #f9f9f9;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 8px;
                 border-bottom: 1px solid #eee;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background-color: #4CAF50;
                 color: white;
             }
         """)
+        self.model.rowsInserted.connect(self.update_count)
+        self.model.rowsRemoved.connect(self.update_count)
+        self.model.modelReset.connect(self.update_count)
         
         # Spotify連携ボタン
         self.spotify_button = QLabel("Spotifyプレイリスト作成")
         self.spotify_button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.spotify_button.setStyleSheet("""
-            background-color: #1DB954;
-            color: white;
-            padding: 15px;
-            border-radius: 8px;
-            font-weight: bold;
-            margin-top: 10px;
-        """)
         self.spotify_button.mousePressEvent = self.on_spotify_button_clicked
         
         layout.addWidget(self.title_label)
         layout.addWidget(self.count_label)
-        layout.addWidget(self.list_widget)
+        layout.addWidget(self.list_view)
         layout.addWidget(self.spotify_button)
         
-        self.setLayout(layout)
-    
-    def add_song(self, song):
-        """楽曲をリストに追加"""
-        item = QListWidgetItem(f"♪ {song}")
-        self.list_widget.addItem(item)
+        # 作成中のSpotifyプレイリスト（ジョブごとに1行）
+        self.jobs_layout = QVBoxLayout()
+        self.jobs_layout.setContentsMargins(0, 5, 0, 0)
+        layout.addLayout(self.jobs_layout)
         
-        # 楽曲数を更新
+        self.setLayout(layout)
         self.update_count()
     
-    def update_count(self):
+    def update_count(self, *args):
         """楽曲数を更新"""
-        count = self.list_widget.count()
+        count = len(self.store)
         self.count_label.setText(f"楽曲数: {count}")
         
-        # ボタンの有効/無効を切り替え
-        if count > 0:
-            self.spotify_button.setStyleSheet("""
-                background-color: #1DB954;
-                color: white;
-                padding: 15px;
-                border-radius: 8px;
-                font-weight: bold;
-                margin-top: 10px;
-                cursor: pointer;
-            """)
-        else:
-            self.spotify_button.setStyleSheet("""
-                background-color: #cccccc;
-                color: #666666;
-                padding: 15px;
-                border-radius: 8px;
-                font-weight: bold;
-                margin-top: 10px;
-                cursor: not-allowed;
-            """)
-    
-    def clear_playlist(self):
-        """プレイリストUIをクリア"""
-        self.list_widget.clear()
-        self.update_count()
-        print("プレイリストUIがクリアされました")
+        # ボタンの有効/無効を切り替え（スタイルシートの解析は空かどうかが変わったときだけ）
+        is_empty = count == 0
+        if is_empty != self._is_empty:
+            self._is_empty = is_empty
+            self.spotify_button.setStyleSheet(SPOTIFY_BUTTON_DISABLED_STYLE if is_empty else SPOTIFY_BUTTON_ENABLED_STYLE)
     
     def on_spotify_button_clicked(self, event):
         """Spotifyボタンクリック時の処理"""
         # リストが空の場合は何もしない
-        if self.list_widget.count() == 0:
+        if len(self.store) == 0:
             return
             
         self.create_spotify_playlist.emit()
     
     def get_song_count(self):
         """現在の楽曲数を取得"""
-        return self.list_widget.count()
+        return len(self.store)
     
     def get_all_songs(self):
-        """すべての楽曲を取得"""
-        songs = []
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            # "♪ " プレフィックスを削除
-            song_text = item.text().replace("♪ ", "")
-            songs.append(song_text)
-        return songs
+        """すべての楽曲を取得（"タイトル - アーティスト" の一覧）"""
+        return list(self.store.labels())
+    
+    def scroll_to_song(self, song):
+        """楽曲の行を表示"""
+        index = self.model.index_for_song(song)
+        if index.isValid():
+            self.list_view.scrollTo(index)
     
-    def remove_song(self, song_text):
-        """特定の楽曲を削除"""
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            if item.text() == f"♪ {song_text}":
-                self.list_widget.takeItem(i)
-                self.update_count()
-                break
+    def add_job(self, job_id, text):
+        """作成ジョブの行を追加"""
+        row = QWidget()
+        row_layout = QHBoxLayout()
+        row_layout.setContentsMargins(0, 0, 0, 0)
+        
+        label = QLabel(text)
+        label.setWordWrap(True)
+        label.setStyleSheet("font-size: 11px; color: #333;")
+        
+        button = QPushButton("×")
+        button.setFixedSize(20, 20)
+        button.setToolTip("キャンセル")
+        button.setStyleSheet("border: none; color: #999; font-weight: bold;")
+        button.clicked.connect(lambda: self.on_job_button_clicked(job_id))
+        
+        row_layout.addWidget(label, 1)
+        row_layout.addWidget(button)
+        row.setLayout(row_layout)
+        
+        self.jobs_layout.addWidget(row)
+        self._job_rows[job_id] = [row, label, button, False]
+    
+    def update_job(self, job_id, text):
+        """作成ジョブの状態表示を更新"""
+        entry = self._job_rows.get(job_id)
+        if entry is not None:
+            entry[1].setText(text)
+    
+    def finish_job(self, job_id, success, message):
+        """作成ジョブの終了を表示（成功したものはしばらくして消す）"""
+        entry = self._job_rows.get(job_id)
+        if entry is None:
+            return
+        row, label, button, _finished = entry
+        entry[3] = True
+        label.setToolTip(message)
+        label.setStyleSheet(f"font-size: 11px; color: {'#1DB954' if success else '#d32f2f'};")
+        button.setToolTip("閉じる")
+        if success:
+            QTimer.singleShot(self.FINISHED_JOB_DISPLAY_MS, lambda: self.remove_job(job_id))
+    
+    def remove_job(self, job_id):
+        """作成ジョブの行を削除"""
+        entry = self._job_rows.pop(job_id, None)
+        if entry is not None:
+            entry[0].deleteLater()
+    
+    def on_job_button_clicked(self, job_id):
+        """実行中のジョブはキャンセル、終了したジョブは表示を閉じる"""
+        entry = self._job_rows.get(job_id)
+        if entry is None:
+            return
+        if entry[3]:
+            self.remove_job(job_id)
+        else:
+            self.cancel_job_requested.emit(job_id)
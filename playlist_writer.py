@@ -0,0 +1,175 @@
+import time
+
+
+# Spotify APIで1回のリクエストに含められるURIの上限
+MAX_URIS_PER_REQUEST = 100
+
+
+def format_track_uri(uri):
+    """spotify:track: プレフィックスがない場合は追加"""
+    return uri if uri.startswith('spotify:') else f'spotify:track:{uri}'
+
+
+class WriteCheckpoint:
+    """プレイリストへの書き込みがどこまで終わったかを表すチェックポイント
+
+    base_position は書き込み開始時のプレイリストの曲数で、各バッチは
+    base_position + written_count の位置に挿入される。
+    """
+
+    def __init__(self, playlist_id, base_position=0, written_count=0, snapshot_id=None):
+        self.playlist_id = playlist_id
+        self.base_position = base_position
+        self.written_count = written_count
+        self.snapshot_id = snapshot_id
+
+    @property
+    def batches_written(self):
+        """書き込み済みのバッチ数"""
+        return (self.written_count + MAX_URIS_PER_REQUEST - 1) // MAX_URIS_PER_REQUEST
+
+    def to_dict(self):
+        return {
+            'playlist_id': self.playlist_id,
+            'base_position': self.base_position,
+            'written_count': self.written_count,
+            'snapshot_id': self.snapshot_id
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['playlist_id'], data.get('base_position', 0),
+                   data.get('written_count', 0), data.get('snapshot_id'))
+
+
+class PlaylistWriteSession:
+    """プレイリストへの追加を100曲ずつ順番どおりに書き込むセッション
+
+    append() で渡されたURIは100曲たまるごとに書き込まれる。再開時は
+    同じURIを最初から渡し直せば、書き込み済みの分は読み飛ばされる。
+    """
+
+    def __init__(self, engine, checkpoint, on_batch_written=None):
+        self.engine = engine
+        self.checkpoint = checkpoint
+        self.on_batch_written = on_batch_written  # callback(checkpoint)
+        self.failed = False
+        self._pending = []
+        self._skip = checkpoint.written_count
+
+    def append(self, uris):
+        """URIを追加（バッチの書き込みに失敗したらFalse）"""
+        if self.failed:
+            return False
+        if isinstance(uris, str):
+            uris = [uris]
+        for uri in uris:
+            if self._skip:
+                self._skip -= 1
+                continue
+            self._pending.append(format_track_uri(uri))
+
+        while len(self._pending) >= MAX_URIS_PER_REQUEST:
+            if not self._write(self._pending[:MAX_URIS_PER_REQUEST]):
+                return False
+            del self._pending[:MAX_URIS_PER_REQUEST]
+        return True
+
+    def flush(self):
+        """残りのURIを書き込む"""
+        if self.failed:
+            return False
+        if self._pending:
+            if not self._write(self._pending):
+                return False
+            self._pending = []
+        return True
+
+    def _write(self, batch):
+        if not self.engine.write_batch(self.checkpoint, batch):
+            self.failed = True
+            return False
+        if self.on_batch_written:
+            self.on_batch_written(self.checkpoint)
+        return True
+
+
+class PlaylistWriteEngine:
+    """プレイリストへの大量の追加・削除を分割して確実に書き込むクラス
+
+    - 100曲ずつのバッチに分割する
+    - 追加は挿入位置を明示して順序を保ち、削除は snapshot_id を引き継ぐ
+    - 失敗したバッチだけを再送する（再送前に前回の書き込みが反映済みか確認する）
+    - WriteCheckpoint を渡すと最後に成功したバッチの次から再開する
+    """
+
+    def __init__(self, client, max_retries=3, base_delay=1.0):
+        self.client = client
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+
+    def open_session(self, playlist_id, checkpoint=None, base_position=None, on_batch_written=None):
+        """追加用のセッションを開く
+
+        base_position を省略すると現在のプレイリストの末尾に追加する。
+        新規作成したプレイリストでは 0 を渡せば曲数の問い合わせを省ける。
+        """
+        if checkpoint is None:
+            if base_position is None:
+                base_position = self.client.get_playlist_length(playlist_id)
+                if base_position is None:
+                    base_position = 0
+            checkpoint = WriteCheckpoint(playlist_id, base_position)
+        return PlaylistWriteSession(self, checkpoint, on_batch_written)
+
+    def add_tracks(self, playlist_id, track_uris, checkpoint=None, base_position=None, on_batch_written=None):
+        """楽曲をすべて追加して (成功したか, チェックポイント) を返す"""
+        session = self.open_session(playlist_id, checkpoint, base_position, on_batch_written)
+        ok = session.append(track_uris) and session.flush()
+        return ok, session.checkpoint
+
+    def remove_tracks(self, playlist_id, track_uris, snapshot_id=None):
+        """楽曲を100曲ずつ削除して (成功したか, 最新の snapshot_id) を返す"""
+        uris = [format_track_uri(uri) for uri in track_uris]
+        for i in range(0, len(uris), MAX_URIS_PER_REQUEST):
+            batch = uris[i:i + MAX_URIS_PER_REQUEST]
+            result = self._with_retries(
+                lambda: self.client.remove_tracks_page(playlist_id, batch, snapshot_id)
+            )
+            if result is None:
+                return False, snapshot_id
+            snapshot_id = result.get('snapshot_id', snapshot_id)
+        return True, snapshot_id
+
+    def write_batch(self, checkpoint, batch):
+        """1バッチを書き込み、成功したらチェックポイントを進める"""
+        position = checkpoint.base_position + checkpoint.written_count
+        expected_length = position + len(batch)
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.base_delay * (2 ** (attempt - 1)))
+                # 応答が失われただけで書き込みは成功していた場合、再送すると重複する
+                length = self.client.get_playlist_length(checkpoint.playlist_id)
+                if length is not None and length >= expected_length:
+                    checkpoint.written_count += len(batch)
+                    return True
+
+            result = self.client.add_tracks_page(checkpoint.playlist_id, batch, position)
+            if result is not None:
+                checkpoint.written_count += len(batch)
+                checkpoint.snapshot_id = result.get('snapshot_id', checkpoint.snapshot_id)
+                return True
+            print(f"バッチの書き込みに失敗しました（位置 {position}、試行 {attempt + 1}）")
+
+        return False
+
+    def _with_retries(self, send):
+        """失敗したら待ってから再送する"""
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.base_delay * (2 ** (attempt - 1)))
+            result = send()
+            if result is not None:
+                return result
+        return None
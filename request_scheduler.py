@@ -0,0 +1,183 @@
+import time
+import heapq
+import random
+import itertools
+import threading
+from contextlib import contextmanager
+import requests
+
+
+# リクエストの優先度（値が小さいほど優先）
+PRIORITY_INTERACTIVE = 0  # 次のカードなど、ユーザーが待っている処理
+PRIORITY_BULK = 1         # プレイリスト作成などのまとめ処理
+
+# 再送しても結果が変わらないHTTPメソッド
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# 再送する一時的なサーバーエラー
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+
+
+class TokenBucket:
+    """トークンバケットによる送信レート制限（ロックは呼び出し側で保持する）"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate          # 1秒あたりに補充されるトークン数
+        self.capacity = capacity  # バースト時の上限
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def time_until_available(self, now):
+        """トークンが1つ使えるようになるまでの秒数"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        """トークンを1つ消費"""
+        self.tokens -= 1
+
+
+class RequestScheduler:
+    """Spotify APIへのリクエストを送信順とレートを管理しながら実行するクラス
+
+    - クライアント側のトークンバケットで送信レートを制限する
+    - 429 の Retry-After を守り、その間はすべてのリクエストを止める
+    - 冪等なリクエストは接続エラーや5xxでジッター付き指数バックオフで再送する
+    - 待ち行列では対話的なリクエストをまとめ処理より先に送る
+    """
+
+    def __init__(self, rate=10.0, burst=10, max_retries=4, base_delay=0.5, max_delay=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._bucket = TokenBucket(rate, burst)
+        self._cond = threading.Condition()
+        self._waiting = []  # (優先度, 受付順) のヒープ
+        self._sequence = itertools.count()
+        self._blocked_until = 0.0  # Retry-After による送信停止の期限
+        self._local = threading.local()
+
+        # 統計
+        self.request_count = 0
+        self.throttled_count = 0
+        self.retry_count = 0
+
+    @contextmanager
+    def priority(self, priority):
+        """このスレッドから送るリクエストの優先度を一時的に変更"""
+        previous = getattr(self._local, 'priority', PRIORITY_INTERACTIVE)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def current_priority(self):
+        """このスレッドの現在の優先度"""
+        return getattr(self._local, 'priority', PRIORITY_INTERACTIVE)
+
+    def execute(self, send, method='GET', priority=None):
+        """send() を送信枠の確保後に実行してレスポンスを返す
+
+        再送しきれなかった場合は最後のレスポンスを返すか、例外を送出する。
+        """
+        if priority is None:
+            priority = self.current_priority()
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+
+        while True:
+            self._acquire(priority)
+            try:
+                response = send()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._count_retry()
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 429:
+                # レート制限中はサーバーで処理されていないので、非冪等でも再送できる
+                with self._cond:
+                    self.throttled_count += 1
+                self._block_for(self._retry_after(response, attempt + 1))
+                if attempt >= self.max_retries:
+                    return response
+                attempt += 1
+                self._count_retry()
+                continue
+
+            if response.status_code in RETRYABLE_STATUS_CODES and idempotent and attempt < self.max_retries:
+                attempt += 1
+                self._count_retry()
+                time.sleep(self._backoff(attempt))
+                continue
+
+            return response
+
+    def stats(self):
+        """キューの深さと制限状況を取得"""
+        with self._cond:
+            return {
+                'queue_depth': len(self._waiting),
+                'request_count': self.request_count,
+                'throttled_count': self.throttled_count,
+                'retry_count': self.retry_count,
+                'blocked_for': max(0.0, self._blocked_until - time.monotonic())
+            }
+
+    def _acquire(self, priority):
+        """送信枠を確保するまで待つ（優先度の高い順、同じ優先度なら受付順）"""
+        ticket = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    timeout = None  # 先頭でなければ順番が来るまで待つ
+                    if self._waiting[0] == ticket:
+                        now = time.monotonic()
+                        timeout = max(self._blocked_until - now, self._bucket.time_until_available(now))
+                        if timeout <= 0:
+                            self._bucket.consume()
+                            self.request_count += 1
+                            return
+                    self._cond.wait(timeout)
+            finally:
+                if self._waiting[0] == ticket:
+                    heapq.heappop(self._waiting)
+                else:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def _block_for(self, seconds):
+        """指定秒数の間、すべての送信を止める"""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def _count_retry(self):
+        with self._cond:
+            self.retry_count += 1
+
+    def _backoff(self, attempt):
+        """ジッター付き指数バックオフの待ち時間"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _retry_after(self, response, attempt):
+        """Retry-After ヘッダーの秒数（なければバックオフ）"""
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return self._backoff(attempt)
@@ -0,0 +1,95 @@
+import re
+import time
+import sqlite3
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+
+
+def normalize_text(text):
+    """比較用に文字列を正規化（全角半角・大文字小文字・記号・空白の違いを吸収）"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def resolution_key(title, artist):
+    """タイトルとアーティストからキャッシュキーを作成"""
+    return f"{normalize_text(title)}\t{normalize_text(artist)}"
+
+
+def match_confidence(title, artist, track):
+    """検索結果のトラックが楽曲とどれだけ一致しているか（0.0〜1.0）"""
+    track_artist = ', '.join(a.get('name', '') for a in track.get('artists', []))
+    expected = normalize_text(f"{title} {artist}")
+    actual = normalize_text(f"{track.get('name', '')} {track_artist}")
+    return SequenceMatcher(None, expected, actual).ratio()
+
+
+class TrackResolutionCache:
+    """タイトル・アーティスト → Spotify URI の解決結果をSQLiteに保存するキャッシュ
+
+    見つからなかった結果も短い有効期間で保存し、同じ検索を繰り返さない。
+    一致度の低い結果も同じく短い有効期間で扱う。スレッドセーフ。
+    """
+
+    def __init__(self, path, positive_ttl=30 * 24 * 3600, negative_ttl=24 * 3600, min_confidence=0.5):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            " key TEXT PRIMARY KEY, uri TEXT, name TEXT, artist TEXT, confidence REAL, fetched_at REAL)"
+        )
+        self._conn.commit()
+
+    def lookup(self, title, artist):
+        """有効期間内の解決結果を取得
+
+        (見つかったか, トラック情報) を返す。トラック情報がNoneなら
+        「Spotifyに存在しない」という結果がキャッシュされている。
+        """
+        key = resolution_key(title, artist)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uri, name, artist, confidence, fetched_at FROM resolutions WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return False, None
+
+        uri, name, track_artist, confidence, fetched_at = row
+        if time.time() - fetched_at >= self._ttl_for(uri, confidence):
+            return False, None
+        if uri is None:
+            return True, None
+        return True, {'uri': uri, 'name': name, 'artists': [{'name': track_artist}], 'confidence': confidence}
+
+    def is_fresh(self, title, artist):
+        """有効期間内の結果があるかどうか"""
+        return self.lookup(title, artist)[0]
+
+    def store(self, title, artist, track):
+        """検索結果を保存（track が None なら見つからなかったことを保存）"""
+        key = resolution_key(title, artist)
+        if track is None:
+            values = (key, None, None, None, 0.0, time.time())
+        else:
+            track_artist = ', '.join(a.get('name', '') for a in track.get('artists', []))
+            confidence = match_confidence(title, artist, track)
+            values = (key, track.get('uri'), track.get('name'), track_artist, confidence, time.time())
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?, ?, ?)", values)
+            self._conn.commit()
+
+    def clear(self):
+        """キャッシュをすべて削除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM resolutions")
+            self._conn.commit()
+
+    def _ttl_for(self, uri, confidence):
+        if uri is None or (confidence or 0.0) < self.min_confidence:
+            return self.negative_ttl
+        return self.positive_ttl
@@ -0,0 +1,198 @@
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+# エンドポイントごとのキャッシュ有効期間（秒）。'/*' で終わるものは配下のパスにも適用し、
+# どれにも該当しないエンドポイント（再生中の曲、推薦など）はキャッシュしない
+DEFAULT_TTLS = {
+    'me': 300,
+    'me/top/tracks': 3600,
+    'me/top/artists': 3600,
+    'me/playlists': 60,
+    'recommendations/available-genre-seeds': 24 * 3600,
+    'tracks': 24 * 3600,
+    'tracks/*': 24 * 3600,
+    'audio-features': 24 * 3600,
+    'artists': 24 * 3600,
+    'search': 3600,
+    'playlists/*': 60,
+}
+
+
+class CacheEntry:
+    """キャッシュされたレスポンス"""
+
+    def __init__(self, key, endpoint, user, body, etag, expires_at):
+        self.key = key
+        self.endpoint = endpoint
+        self.user = user
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+    def is_fresh(self):
+        """有効期間内かどうか"""
+        return time.time() < self.expires_at
+
+
+class SQLiteResponseStore:
+    """レスポンスキャッシュのSQLite保存先（アプリ再起動後も使える）
+
+    開いたときと prune_interval 件書き込むごとに、ETag のない期限切れの
+    エントリ（再検証にも使えない）を削除し、max_rows 件を超えた分は
+    期限の早いものから削除する。
+    """
+
+    def __init__(self, path, max_rows=5000, prune_interval=100):
+        self.max_rows = max_rows
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._puts_since_prune = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, endpoint TEXT, user TEXT, body TEXT, etag TEXT, expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+        self._conn.commit()
+        self.prune()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT endpoint, user, body, etag, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        endpoint, user, body, etag, expires_at = row
+        return CacheEntry(key, endpoint, user, json.loads(body), etag, expires_at)
+
+    def put(self, entry):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (entry.key, entry.endpoint, entry.user, json.dumps(entry.body), entry.etag, entry.expires_at)
+            )
+            self._conn.commit()
+            self._puts_since_prune += 1
+            if self._puts_since_prune < self.prune_interval:
+                return
+        self.prune()
+
+    def prune(self):
+        """期限切れで再検証にも使えないエントリと、上限を超えた古いエントリを削除"""
+        with self._lock:
+            self._puts_since_prune = 0
+            self._conn.execute(
+                "DELETE FROM responses WHERE expires_at < ? AND (etag IS NULL OR etag = '')", (time.time(),)
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_rows:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN"
+                    " (SELECT key FROM responses ORDER BY expires_at LIMIT ?)",
+                    (count - self.max_rows,)
+                )
+            self._conn.commit()
+
+    def delete_prefix(self, endpoint_prefix, user):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM responses WHERE user = ? AND (endpoint = ? OR endpoint LIKE ?)",
+                (user, endpoint_prefix, endpoint_prefix + '/%')
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+class ResponseCache:
+    """Spotify APIのGETレスポンスキャッシュ（スレッドセーフ）
+
+    キーは (エンドポイント, パラメータ, ユーザー)。メモリ上のLRUを優先し、
+    store（SQLiteResponseStore など）があれば裏で永続化する。期限切れの
+    エントリも ETag があれば条件付きリクエストの再検証に使える。
+    """
+
+    def __init__(self, max_entries=512, ttls=None, store=None):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.store = store
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def ttl_for(self, endpoint):
+        """エンドポイントの有効期間（キャッシュしない場合はNone）"""
+        if endpoint in self.ttls:
+            return self.ttls[endpoint]
+        parts = endpoint.split('/')
+        for length in range(len(parts) - 1, 0, -1):
+            ttl = self.ttls.get('/'.join(parts[:length]) + '/*')
+            if ttl is not None:
+                return ttl
+        return None
+
+    @staticmethod
+    def make_key(endpoint, params, user):
+        """キャッシュキーを作成"""
+        normalized = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        return json.dumps([user, endpoint, normalized], ensure_ascii=False)
+
+    def get(self, key):
+        """エントリを取得（期限切れも含む、なければNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        if self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None:
+                self._remember(entry)
+            return entry
+        return None
+
+    def put(self, key, endpoint, user, body, etag, ttl):
+        """レスポンスを保存"""
+        entry = CacheEntry(key, endpoint, user, body, etag, time.time() + ttl)
+        self._remember(entry)
+        if self.store is not None:
+            self.store.put(entry)
+
+    def refresh(self, entry, ttl):
+        """304 Not Modified を受けたエントリの有効期間を延長"""
+        entry.expires_at = time.time() + ttl
+        self._remember(entry)
+        if self.store is not None:
+            self.store.put(entry)
+
+    def invalidate(self, endpoint_prefix, user):
+        """エンドポイント（とその配下）のキャッシュを削除"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if entry.user == user and (entry.endpoint == endpoint_prefix
+                                                or entry.endpoint.startswith(endpoint_prefix + '/'))]
+            for key in stale:
+                del self._entries[key]
+        if self.store is not None:
+            self.store.delete_prefix(endpoint_prefix, user)
+
+    def clear(self):
+        """キャッシュをすべて削除"""
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def _remember(self, entry):
+        with self._lock:
+            self._entries[entry.key] = entry
+            self._entries.move_to_end(entry.key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,17 +1,122 @@
+import threading
+import weakref
+
+
 class Song:
-    """楽曲データを管理するクラス"""
-    def __init__(self, title, artist, image_url, spotify_id=None, preview_url=None, spotify_uri=None):
-        self.title = title
-        self.artist = artist
-        self.image_url = image_url
-        self.spotify_id = spotify_id
-        self.preview_url = preview_url
-        self.spotify_uri = spotify_uri
+    """楽曲データを管理するクラス
+
+    __slots__ でインスタンスごとの __dict__ を持たず、作成後は変更できない
+    （変更したものが必要なら replace() で新しい Song を作る）。
+    等価性とハッシュはタイトルとアーティストで決まるので、set や dict のキーに使える。
+    """
+    __slots__ = ("title", "artist", "image_url", "spotify_id", "preview_url", "spotify_uri", "images",
+                 "_hash", "__weakref__")
+    
+    def __init__(self, title, artist, image_url, spotify_id=None, preview_url=None, spotify_uri=None, images=None):
+        init = object.__setattr__
+        init(self, "title", title)
+        init(self, "artist", artist)
+        init(self, "image_url", image_url)
+        init(self, "spotify_id", spotify_id)
+        init(self, "preview_url", preview_url)
+        init(self, "spotify_uri", spotify_uri)
+        # 画像のサイズ違い ({"url": ..., "width": ..., "height": ...}, ...)
+        init(self, "images", tuple(images or ()))
+        init(self, "_hash", hash((title, artist)))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Song は変更できません: {name}")
+    
+    def __delattr__(self, name):
+        raise AttributeError(f"Song は変更できません: {name}")
+    
+    def __reduce__(self):
+        return (Song, (self.title, self.artist, self.image_url, self.spotify_id,
+                       self.preview_url, self.spotify_uri, self.images))
     
     def __str__(self):
         return f"{self.title} - {self.artist}"
     
+    def __repr__(self):
+        return f"Song({self.title!r}, {self.artist!r}, spotify_id={self.spotify_id!r})"
+    
     def __eq__(self, other):
         if isinstance(other, Song):
             return self.title == other.title and self.artist == other.artist
         return False
+    
+    def __hash__(self):
+        return self._hash
+    
+    def replace(self, **changes):
+        """一部の属性を変更した新しい Song を作成"""
+        data = self.to_dict()
+        data.update(changes)
+        return Song.from_dict(data)
+    
+    def to_dict(self):
+        """保存用の辞書に変換"""
+        return {
+            "title": self.title,
+            "artist": self.artist,
+            "image_url": self.image_url,
+            "spotify_id": self.spotify_id,
+            "preview_url": self.preview_url,
+            "spotify_uri": self.spotify_uri,
+            "images": list(self.images)
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """to_dict() の辞書から復元"""
+        return cls(
+            data["title"],
+            data["artist"],
+            data.get("image_url"),
+            spotify_id=data.get("spotify_id"),
+            preview_url=data.get("preview_url"),
+            spotify_uri=data.get("spotify_uri"),
+            images=data.get("images")
+        )
+
+
+class SongRegistry:
+    """spotify_id ごとに Song を1つにまとめる登録簿（スレッドセーフ）
+
+    別の取得方法や再読み込みで同じトラックが何度作られても、最初に
+    登録された Song を共有する。どこからも参照されなくなった Song は
+    自動的に登録が外れる。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._songs = weakref.WeakValueDictionary()  # spotify_id -> Song
+    
+    def intern(self, song):
+        """登録済みの同じトラックがあればそれを、なければ song を登録して返す"""
+        if not song.spotify_id:
+            return song
+        with self._lock:
+            existing = self._songs.get(song.spotify_id)
+            if existing is not None:
+                return existing
+            self._songs[song.spotify_id] = song
+            return song
+    
+    def get(self, spotify_id):
+        """登録済みの Song（なければNone）"""
+        with self._lock:
+            return self._songs.get(spotify_id)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._songs)
+
+
+# アプリ全体で共有する登録簿
+song_registry = SongRegistry()
+
+
+def intern_song(song):
+    """song_registry に登録して共有の Song を返す"""
+    return song_registry.intern(song)
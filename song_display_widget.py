@@ -1,13 +1,24 @@
 from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout
-from PyQt6.QtCore import Qt
-from image_loader import ImageLoader
+from PyQt6.QtCore import Qt, pyqtSignal
+from image_loader import AsyncImageLoader, ImageLoader, THUMBNAIL_SIZES
 
 
 class SongDisplayWidget(QWidget):
     """楽曲表示ウィジェット"""
-    def __init__(self):
+    # 表示先の画面のデバイスピクセル比が分かった・変わった（先読みを同じ解像度にするため）
+    device_pixel_ratio_changed = pyqtSignal(float)
+    
+    def __init__(self, image_loader=None):
         super().__init__()
         self.current_song = None
+        self._watched_window = None
+
+        # 画像の非同期読み込み（表示中カードのリクエストIDのみ有効）
+        self.image_loader = image_loader or AsyncImageLoader(parent=self)
+        self.image_loader.image_loaded.connect(self.on_image_loaded)
+        self._image_request_id = None
+        self._preview_request_id = None
+
         self.init_ui()
     
     def init_ui(self):
@@ -50,30 +61,117 @@ class SongDisplayWidget(QWidget):
         
         self.setLayout(layout)
     
+    def showEvent(self, event):
+        super().showEvent(event)
+        # 別の画面へ移動したときもデバイスピクセル比を通知する
+        window = self.window().windowHandle()
+        if window is not None and window is not self._watched_window:
+            self._watched_window = window
+            window.screenChanged.connect(self._notify_device_pixel_ratio)
+        self._notify_device_pixel_ratio()
+    
+    def _notify_device_pixel_ratio(self, *args):
+        self.device_pixel_ratio_changed.emit(self.devicePixelRatioF())
+    
     def display_song(self, song):
         """楽曲を表示"""
         self.current_song = song
         self.title_label.setText(song.title)
         self.artist_label.setText(song.artist)
         
-        # 画像の読み込み
-        pixmap = ImageLoader.load_pixmap_from_url(song.image_url)
-        if pixmap:
-            self.image_label.setPixmap(pixmap)
-        else:
-            self.image_label.setText(f"🎵\n{song.title}\n\n画像読み込み中...")
-            self.image_label.setStyleSheet("""
-                border: 2px solid #ddd; 
-                background-color: #f9f9f9; 
-                color: #666;
-                font-size: 16px;
-                border-radius: 10px;
-            """)
+        # 前のカードの読み込みは不要になるのでキャンセル
+        self._cancel_image_request()
+
+        # 画面のデバイスピクセルサイズを満たす最小の画像を選ぶ
+        device_pixel_ratio = self.devicePixelRatioF()
+        image_url, size = ImageLoader.card_image_request(song, (300, 300), device_pixel_ratio)
+
+        # メモリキャッシュにあればネットワークなしで即座に表示
+        pixmap = self.image_loader.get_cached(image_url, size)
+        if pixmap is not None:
+            self._show_pixmap(pixmap)
+            return
+
+        # プレースホルダーを即座に表示し、画像はバックグラウンドで読み込む
+        self._show_image_text(f"🎵\n{song.title}\n\n画像読み込み中...")
+        self._image_request_id = self.image_loader.load(image_url, size)
+
+        # 小さいサイズの画像を先に表示して、本来の画像が届いたら差し替える
+        preview_url = ImageLoader.select_preview_image_url(song)
+        if preview_url and preview_url != image_url:
+            preview = self.image_loader.get_cached(preview_url, THUMBNAIL_SIZES[0])
+            if preview is not None:
+                self._show_preview(preview)
+            else:
+                self._preview_request_id = self.image_loader.load(preview_url, THUMBNAIL_SIZES[0])
+    
+    def on_image_loaded(self, request_id, pixmap):
+        """画像読み込み完了時の処理"""
+        if request_id == self._preview_request_id:
+            self._preview_request_id = None
+            # 本来の画像がまだ届いていなければ仮表示する
+            if self._image_request_id is not None and not pixmap.isNull():
+                self._show_preview(pixmap)
+            return
+
+        # 既にスワイプで次のカードに移っている場合は破棄
+        if request_id != self._image_request_id:
+            return
+        self._image_request_id = None
+
+        if not pixmap.isNull():
+            self._show_pixmap(pixmap)
+        elif self.image_label.pixmap() is None or self.image_label.pixmap().isNull():
+            self._show_image_text(f"🎵\n{self.current_song.title}\n\n画像を読み込めませんでした")
+    
+    def _show_pixmap(self, pixmap):
+        """画像を表示"""
+        pixmap.setDevicePixelRatio(self.devicePixelRatioF())
+        self.image_label.setPixmap(pixmap)
+    
+    def _show_preview(self, pixmap):
+        """小さいサイズの画像を拡大して仮表示"""
+        self.image_label.setPixmap(pixmap.scaled(
+            300, 300,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation
+        ))
+    
+    def _show_image_text(self, text):
+        """画像の代わりにテキストを表示"""
+        self.image_label.clear()
+        self.image_label.setText(text)
+        self.image_label.setStyleSheet("""
+            border: 2px solid #ddd; 
+            background-color: #f9f9f9; 
+            color: #666;
+            font-size: 16px;
+            border-radius: 10px;
+        """)
+    
+    def _cancel_image_request(self):
+        """読み込み中の画像リクエストをキャンセル"""
+        if self._image_request_id is not None:
+            self.image_loader.cancel(self._image_request_id)
+            self._image_request_id = None
+        if self._preview_request_id is not None:
+            self.image_loader.cancel(self._preview_request_id)
+            self._preview_request_id = None
+    
+    def show_loading_message(self):
+        """次の楽曲を取得中のメッセージを表示"""
+        self.current_song = None
+        self.title_label.setText("次の曲を探しています...")
+        self.artist_label.setText("")
+        self._cancel_image_request()
+        self.image_label.clear()
+        self.image_label.setText("🔍")
     
     def show_completion_message(self, playlist_count):
         """完了メッセージを表示"""
         self.title_label.setText("🎉 すべての曲をチェックしました！")
         self.artist_label.setText(f"プレイリストに {playlist_count} 曲追加されました")
+        self._cancel_image_request()
         self.image_label.clear()
         self.image_label.setText("完了")
         self.instruction_label.setText("アプリケーションを終了してください")
@@ -1,23 +1,184 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 from song import Song
+from song_table import SongTable
+from placeholder_renderer import placeholder_url
 
 
-class SongManager:
-    """楽曲データ管理クラス"""
-    def __init__(self):
-        self.songs = [
+class _RefillSignals(QObject):
+    """ワーカーからGUIスレッドへ追加取得した楽曲を届けるためのシグナル"""
+    page_ready = pyqtSignal(int, object)  # 世代, 楽曲のリスト（取得に失敗した場合はNone）
+
+
+class _RefillTask(QRunnable):
+    """producer から次のページの楽曲を取得するワーカータスク"""
+    def __init__(self, signals, generation, producer, page):
+        super().__init__()
+        self.signals = signals
+        self.generation = generation
+        self.producer = producer
+        self.page = page
+
+    def run(self):
+        try:
+            songs = self.producer(self.page)
+            if songs is not None:
+                songs = list(songs)
+        except Exception as e:
+            print(f"楽曲の追加取得エラー: {e}")
+            songs = None
+        self.signals.page_ready.emit(self.generation, songs)
+
+
+class SongManager(QObject):
+    """楽曲データ管理クラス
+
+    set_producer() で楽曲の供給元（ページ番号を受け取って楽曲のリストを返す
+    関数、取得に失敗したらNoneを返すか例外を送出する）を設定すると、残りの
+    曲数が low_watermark を下回るたびに次のページをバックグラウンドで取得して
+    デッキの末尾に追加する。すでにデッキに入った楽曲や、これまでのデッキで
+    表示した楽曲と同じ曲は追加しない。取得に失敗したページは間隔を空けながら取得し直し、
+    取得できたのに新しい曲が1曲もないページが max_empty_pages 回続いたときだけ、
+    供給元は尽きたものとして取得をやめる。
+    """
+    # 取得に失敗したページを取得し直すまでの待ち時間（ミリ秒、失敗が続くたびに倍にする）
+    RETRY_BASE_MS = 1000
+    RETRY_MAX_MS = 60000
+    songs_added = pyqtSignal(int)  # 追加された曲数
+    producer_exhausted = pyqtSignal()
+    
+    def __init__(self, prefetcher=None, low_watermark=5, max_empty_pages=3, parent=None):
+        super().__init__(parent)
+        # 次のカードを先読みするオブジェクト（省略可）
+        self.prefetcher = prefetcher
+        self.low_watermark = low_watermark
+        self.max_empty_pages = max_empty_pages
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self._signals = _RefillSignals()
+        self._signals.page_ready.connect(self._on_page_ready)
+
+        self._producer = None
+        self._generation = 0    # デッキを差し替えるたびに増やし、古い取得結果を捨てる
+        self._next_page = 0
+        self._empty_pages = 0
+        self._failed_attempts = 0  # 同じページの取得に続けて失敗した回数
+        self._refilling = False
+        self._seen = set()      # デッキに入れた楽曲の (タイトル, アーティスト)
+        self._shown = set()     # これまでのデッキで表示した楽曲の (タイトル, アーティスト)
+
+        self._retry_timer = QTimer(self)
+        self._retry_timer.setSingleShot(True)
+        self._retry_timer.timeout.connect(self._start_refill)
+
+        self.songs = SongTable([
             # image_urlの後に、spotify_id=None, preview_url=None, spotify_uri='...' を追加
-            Song("ブルーバード", "いきものがかり", "https://via.placeholder.com/250x250/4CAF50/white?text=ブルーバード",
+            Song("ブルーバード", "いきものがかり", placeholder_url("ブルーバード", "4CAF50", "white"),
                  spotify_id="7rVjP6H6g8pQ8fN3Jg9n", # 例: 適当なID。Spotifyの実際のIDに置き換える
                  preview_url="https://www.soundhelix.com/examples/mp3/SoundHelix-Song-1.mp3",
                  spotify_uri="spotify:track:YOUR_BLUEBIRD_URI"), # <-- 実際のURIに置き換える
-            Song("Pretender", "Official髭男dism", "https://via.placeholder.com/250x250/2196F3/white?text=Pretender",
+            Song("Pretender", "Official髭男dism", placeholder_url("Pretender", "2196F3", "white"),
                  spotify_id="2K98C8W3qDkL2Q3w4q5y", # 例: 適当なID。
                  preview_url="https://www.soundhelix.com/examples/mp3/SoundHelix-Song-2.mp3",
                  spotify_uri="spotify:track:YOUR_PRETENDER_URI"), # <-- 実際のURIに置き換える
             # 他の曲も同様に spotify_id と spotify_uri を追加
             # Spotify APIから取得する際はこれらの情報が提供されます
-        ]
+        ])
         self.current_index = 0
+        self._on_index_changed()
+    
+    def set_songs(self, songs):
+        """楽曲リストを差し替え（リストは SongTable に変換して保持）"""
+        self._start_deck(None, SongTable.from_songs(songs))
+    
+    def set_producer(self, producer, songs=None):
+        """供給元から楽曲を順次取得するデッキに差し替え（songs は最初に並べる楽曲）"""
+        deck = SongTable()
+        self._start_deck(producer, deck)
+        if songs:
+            self._append_new(songs)
+        self._on_index_changed()
+    
+    def _start_deck(self, producer, songs):
+        # 古いデッキで表示した楽曲は、次のデッキにも追加しない
+        old_songs = self.songs
+        for i in range(min(self.current_index + 1, len(old_songs))):
+            self._shown.add((old_songs.title(i), old_songs.artist(i)))
+        
+        # 古いデッキの先読みと取得中のページは不要になるので破棄
+        if self.prefetcher:
+            self.prefetcher.cancel_all()
+        self._generation += 1
+        self._retry_timer.stop()
+        self._producer = producer
+        self._next_page = 0
+        self._empty_pages = 0
+        self._failed_attempts = 0
+        self._refilling = False
+        self.songs = songs
+        self._seen = set(self._shown)
+        self._seen.update((songs.title(i), songs.artist(i)) for i in range(len(songs)))
+        self.current_index = 0
+        self._on_index_changed()
+    
+    def _on_index_changed(self):
+        """現在位置の変更を先読みに通知し、残りが少なければ追加取得を始める"""
+        if self.prefetcher:
+            self.prefetcher.prefetch_from(self.songs, self.current_index)
+        self._refill_if_needed()
+    
+    def _refill_if_needed(self):
+        if self._producer is None or self._refilling:
+            return
+        if len(self.songs) - self.current_index >= self.low_watermark:
+            return
+        self._refilling = True
+        self._start_refill()
+    
+    def _start_refill(self):
+        """次のページ（失敗したときは同じページ）の取得を開始"""
+        if self._producer is None:
+            return
+        self.thread_pool.start(_RefillTask(self._signals, self._generation, self._producer, self._next_page))
+    
+    def _append_new(self, songs):
+        """まだデッキにない楽曲だけを末尾に追加し、追加した曲数を返す"""
+        added = 0
+        for song in songs:
+            key = (song.title, song.artist)
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            self.songs.append(song)
+            added += 1
+        return added
+    
+    def _on_page_ready(self, generation, songs):
+        if generation != self._generation:
+            return  # 差し替え前のデッキの取得結果
+        if songs is None:
+            # 通信エラーなどは「新しい曲がない」とは数えず、間隔を空けて同じページを取得し直す
+            self._failed_attempts += 1
+            delay = min(self.RETRY_MAX_MS, self.RETRY_BASE_MS * 2 ** (self._failed_attempts - 1))
+            print(f"楽曲の追加取得に失敗しました。{delay / 1000:.0f}秒後に再試行します")
+            self._retry_timer.start(delay)
+            return
+        self._failed_attempts = 0
+        self._next_page += 1
+        self._refilling = False
+        added = self._append_new(songs)
+        if added:
+            self._empty_pages = 0
+        else:
+            self._empty_pages += 1
+            if self._empty_pages >= self.max_empty_pages:
+                print("新しい楽曲が見つからないため、追加取得を終了します")
+                self._producer = None
+                self.producer_exhausted.emit()
+                return
+        if added:
+            self.songs_added.emit(added)
+        self._on_index_changed()
     
     def get_current_song(self):
         """現在の楽曲を取得"""
@@ -27,13 +188,21 @@ class SongManager:
     
     def next_song(self):
         """次の楽曲に移動"""
-        self.current_index += 1
+        # 取得待ちの間にスワイプされても、末尾を越えて進めない
+        if self.current_index < len(self.songs):
+            self.current_index += 1
+        self._on_index_changed()
         return self.get_current_song()
     
     def has_next_song(self):
-        """次の楽曲があるかチェック"""
-        return self.current_index < len(self.songs)
+        """次の楽曲があるかチェック（供給元から取得できる見込みがあれば True）"""
+        return self.current_index < len(self.songs) or self._producer is not None
+    
+    def is_loading(self):
+        """楽曲を取得中か"""
+        return self._refilling
     
     def reset(self):
         """楽曲インデックスをリセット"""
         self.current_index = 0
+        self._on_index_changed()
@@ -0,0 +1,129 @@
+import os
+import threading
+from PyQt6.QtGui import QImage, QPixmap, QGuiApplication
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from image_cache import DiskImageCache
+from image_loader import ImageLoader
+from placeholder_renderer import is_placeholder_url
+
+
+class _PrefetchSignals(QObject):
+    """ワーカーからGUIスレッドへ先読み結果を届けるためのシグナル"""
+    image_ready = pyqtSignal(int, str, int, int, QImage)  # 世代, URL, 幅, 高さ, 画像
+    thumbnails_ready = pyqtSignal(str, object)  # URL, {サイズ: QImage}
+
+
+class _PrefetchTask(QRunnable):
+    """1曲分の画像とプレビュー音声を先読みするワーカータスク"""
+    def __init__(self, prefetcher, generation, song, image_url, size):
+        super().__init__()
+        self.prefetcher = prefetcher
+        self.generation = generation
+        self.song = song
+        self.image_url = image_url
+        self.size = size
+
+    def run(self):
+        if self.prefetcher.is_stale(self.generation):
+            return
+
+        # 画像（ディスクキャッシュへの保存とデコードまで済ませる）
+        if self.image_url:
+            image = ImageLoader.load_image_from_url(self.image_url, self.size)
+            if image is not None and not self.prefetcher.is_stale(self.generation):
+                self.prefetcher._signals.image_ready.emit(
+                    self.generation, self.image_url, self.size[0], self.size[1], image
+                )
+                thumbnails = ImageLoader.make_thumbnails(image)
+                if thumbnails:
+                    self.prefetcher._signals.thumbnails_ready.emit(self.image_url, thumbnails)
+
+        # プレビュー音声（バイト列をディスクキャッシュに保存）
+        if self.song.preview_url and not self.prefetcher.is_stale(self.generation):
+            try:
+                ImageLoader.fetch_image_bytes(self.song.preview_url, cache=self.prefetcher.preview_cache)
+            except Exception as e:
+                print(f"プレビュー先読みエラー: {e}")
+
+
+class SongPrefetcher(QObject):
+    """現在のカードの次のN曲をバックグラウンドで先読みするクラス
+
+    画像のダウンロードとデコード、プレビュー音声のダウンロードを行い、
+    デコード済みの画像は ImageLoader のメモリキャッシュに格納する。
+    デッキが差し替えられたら cancel_all() で未完了の先読みを破棄する。
+    """
+
+    def __init__(self, lookahead=3, image_size=(300, 300), max_workers=2, parent=None):
+        super().__init__(parent)
+        self.lookahead = lookahead
+        self.image_size = tuple(image_size)
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max_workers)
+
+        # プレビュー音声用のディスクキャッシュ
+        self.preview_cache = DiskImageCache(
+            directory=os.path.join(os.path.expanduser("~"), ".cache", "meetune", "previews"),
+            max_bytes=200 * 1024 * 1024
+        )
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._scheduled = set()  # 現在の世代で先読み済み（または予約済み）のURL
+        # カードを表示するウィジェットのデバイスピクセル比（未設定ならプライマリ画面の値）
+        self.device_pixel_ratio = None
+
+        self._signals = _PrefetchSignals()
+        self._signals.image_ready.connect(self._on_image_ready)
+        self._signals.thumbnails_ready.connect(ImageLoader.store_thumbnails)
+
+    def set_device_pixel_ratio(self, ratio):
+        """カードを表示する画面のデバイスピクセル比を設定（表示側と同じ画像を先読みするため）"""
+        if ratio == self.device_pixel_ratio:
+            return
+        self.device_pixel_ratio = ratio
+        # 別の解像度で予約した分は、新しい解像度で先読みし直せるようにする
+        self._scheduled.clear()
+
+    def prefetch_from(self, songs, current_index):
+        """current_index の次から lookahead 曲分の先読みを予約"""
+        device_pixel_ratio = self.device_pixel_ratio
+        if device_pixel_ratio is None:
+            screen = QGuiApplication.primaryScreen()
+            device_pixel_ratio = screen.devicePixelRatio() if screen else 1.0
+
+        end = min(len(songs), current_index + 1 + self.lookahead)
+        for index in range(current_index + 1, end):
+            song = songs[index]
+            # 表示時と同じ解像度の画像を同じサイズで先読みする
+            image_url, size = ImageLoader.card_image_request(song, self.image_size, device_pixel_ratio)
+            if is_placeholder_url(image_url):
+                image_url = None  # 表示時にローカルで描画するので先読み不要
+            key = image_url or song.preview_url
+            if not key or key in self._scheduled:
+                continue
+            self._scheduled.add(key)
+
+            if ImageLoader.memory_cache.get(image_url, size) is not None and not song.preview_url:
+                continue
+            self.thread_pool.start(_PrefetchTask(self, self._generation, song, image_url, size))
+
+    def cancel_all(self):
+        """未完了の先読みをすべてキャンセル"""
+        with self._lock:
+            self._generation += 1
+        self._scheduled.clear()
+        # まだ開始していないタスクはキューから取り除く
+        self.thread_pool.clear()
+
+    def is_stale(self, generation):
+        """タスクの世代が古くなっている（キャンセル済み）かチェック"""
+        with self._lock:
+            return generation != self._generation
+
+    def _on_image_ready(self, generation, url, width, height, image):
+        """先読みした画像をメモリキャッシュに格納（GUIスレッドで実行）"""
+        if self.is_stale(generation):
+            return
+        ImageLoader.memory_cache.put(url, (width, height), QPixmap.fromImage(image))
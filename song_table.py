@@ -0,0 +1,230 @@
+import random
+import weakref
+from array import array
+from itertools import compress
+from song import Song, intern_song
+
+
+# SpotifyのIDは22文字のBase62
+SPOTIFY_ID_WIDTH = 22
+
+
+class StringPool:
+    """文字列を番号に置き換えて1回だけ保持するプール（0番は None）"""
+
+    def __init__(self):
+        self._strings = [None]
+        self._ids = {}
+
+    def intern(self, text):
+        """文字列の番号を取得（なければ追加）"""
+        if text is None:
+            return 0
+        string_id = self._ids.get(text)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(text)
+            self._ids[text] = string_id
+        return string_id
+
+    def find(self, text):
+        """文字列の番号（プールになければ-1）"""
+        if text is None:
+            return 0
+        return self._ids.get(text, -1)
+
+    def __getitem__(self, string_id):
+        return self._strings[string_id]
+
+    def __len__(self):
+        return len(self._strings) - 1
+
+
+class _SongColumns:
+    """SongTable の実データ（列ごとの配列、行は追加のみ）"""
+
+    def __init__(self):
+        self.titles = StringPool()
+        self.artists = StringPool()
+        self.urls = StringPool()          # 画像・プレビュー・URI など
+        self.image_sets = [()]            # 画像のサイズ違い（0番は空）
+        self._image_set_ids = {(): 0}
+
+        self.title_ids = array('I')
+        self.artist_ids = array('I')
+        self.image_url_ids = array('I')
+        self.preview_url_ids = array('I')
+        self.spotify_uri_ids = array('I')
+        self.image_set_ids = array('I')
+        self.spotify_ids = bytearray()    # 固定長（SPOTIFY_ID_WIDTH バイト）、未設定は 0 埋め
+        self.extra_ids = {}               # 固定長に収まらないIDの例外（行 -> ID）
+
+        # 表示中の Song を行ごとに共有する（参照がなくなれば消える）
+        self.materialized = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self.title_ids)
+
+    def append(self, song):
+        """1曲追加して行番号を返す"""
+        row = len(self.title_ids)
+        self.title_ids.append(self.titles.intern(song.title))
+        self.artist_ids.append(self.artists.intern(song.artist))
+        self.image_url_ids.append(self.urls.intern(song.image_url))
+        self.preview_url_ids.append(self.urls.intern(song.preview_url))
+        self.spotify_uri_ids.append(self.urls.intern(song.spotify_uri))
+        self.image_set_ids.append(self._intern_images(song.images))
+
+        try:
+            spotify_id = (song.spotify_id or '').encode('ascii')
+        except UnicodeEncodeError:
+            spotify_id = None
+        if spotify_id is None or len(spotify_id) > SPOTIFY_ID_WIDTH or b'\0' in spotify_id:
+            # 固定長の列にそのまま入らないIDは別に保持する（変換して別の値にしない）
+            self.extra_ids[row] = song.spotify_id
+            spotify_id = b''
+        self.spotify_ids += spotify_id.ljust(SPOTIFY_ID_WIDTH, b'\0')
+        return row
+
+    def spotify_id(self, row):
+        if row in self.extra_ids:
+            return self.extra_ids[row]
+        start = row * SPOTIFY_ID_WIDTH
+        raw = bytes(self.spotify_ids[start:start + SPOTIFY_ID_WIDTH]).rstrip(b'\0')
+        return raw.decode('ascii') if raw else None
+
+    def song(self, row):
+        """行の Song を作成（表示中のものがあればそれを返す）"""
+        song = self.materialized.get(row)
+        if song is None:
+            images = [{'url': url, 'width': width, 'height': height}
+                      for url, width, height in self.image_sets[self.image_set_ids[row]]]
+            song = intern_song(Song(
+                self.titles[self.title_ids[row]],
+                self.artists[self.artist_ids[row]],
+                self.urls[self.image_url_ids[row]],
+                spotify_id=self.spotify_id(row),
+                preview_url=self.urls[self.preview_url_ids[row]],
+                spotify_uri=self.urls[self.spotify_uri_ids[row]],
+                images=images
+            ))
+            self.materialized[row] = song
+        return song
+
+    def _intern_images(self, images):
+        key = tuple((image.get('url'), image.get('width'), image.get('height')) for image in images or ())
+        image_set_id = self._image_set_ids.get(key)
+        if image_set_id is None:
+            image_set_id = len(self.image_sets)
+            self.image_sets.append(key)
+            self._image_set_ids[key] = image_set_id
+        return image_set_id
+
+
+class SongTable:
+    """列ごとの配列で楽曲を保持するテーブル（大量の楽曲のデッキ・カタログ用）
+
+    タイトル・アーティスト・URLは文字列プールの番号、Spotify IDは固定長の
+    バイト列として保持し、Song は参照されたときに初めて作る。
+    テーブルは実データへの行番号の配列なので、スライス・シャッフル・
+    絞り込みは行番号の配列を作り直すだけで、楽曲データはコピーしない。
+    リストと同じく len() と添字で参照できる。
+    """
+
+    def __init__(self, songs=None, _columns=None, _rows=None):
+        self._columns = _columns if _columns is not None else _SongColumns()
+        self._rows = _rows if _rows is not None else array('I')
+        if songs is not None:
+            self.extend(songs)
+
+    @classmethod
+    def from_songs(cls, songs):
+        """Song のリストからテーブルを作成（テーブルならそのまま返す）"""
+        if isinstance(songs, SongTable):
+            return songs
+        return cls(songs)
+
+    def _view(self, rows):
+        """同じ実データを参照する別の並びのテーブル"""
+        return SongTable(_columns=self._columns, _rows=rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._view(self._rows[index])
+        return self._columns.song(self._rows[index])
+
+    def __iter__(self):
+        song = self._columns.song
+        for row in self._rows:
+            yield song(row)
+
+    def __bool__(self):
+        return len(self._rows) > 0
+
+    def append(self, song):
+        """末尾に1曲追加"""
+        self._rows.append(self._columns.append(song))
+
+    def extend(self, songs):
+        """末尾にまとめて追加"""
+        if isinstance(songs, SongTable) and songs._columns is self._columns:
+            self._rows.extend(songs._rows)
+            return
+        for song in songs:
+            self.append(song)
+
+    def title(self, index):
+        """Song を作らずにタイトルを取得"""
+        return self._columns.titles[self._columns.title_ids[self._rows[index]]]
+
+    def artist(self, index):
+        """Song を作らずにアーティストを取得"""
+        return self._columns.artists[self._columns.artist_ids[self._rows[index]]]
+
+    def spotify_id(self, index):
+        """Song を作らずに Spotify ID を取得"""
+        return self._columns.spotify_id(self._rows[index])
+
+    def keys(self):
+        """各行のキー（タイトル番号とアーティスト番号を1つの整数にしたもの、Song の等価性と同じ基準）を順に返す"""
+        title_ids = self._columns.title_ids
+        artist_ids = self._columns.artist_ids
+        for row in self._rows:
+            yield (title_ids[row] << 32) | artist_ids[row]
+
+    def shuffled(self, rng=random):
+        """並びをシャッフルしたテーブル"""
+        rows = array('I', self._rows)
+        rng.shuffle(rows)
+        return self._view(rows)
+
+    def compress(self, mask):
+        """mask が真の行だけのテーブル"""
+        return self._view(array('I', compress(self._rows, mask)))
+
+    def filter_artist(self, artist):
+        """アーティストで絞り込んだテーブル"""
+        artist_id = self._columns.artists.find(artist)
+        artist_ids = self._columns.artist_ids
+        return self.compress(artist_ids[row] == artist_id for row in self._rows)
+
+    def filter(self, predicate):
+        """predicate(Song) が真の楽曲だけのテーブル（Song を作るので遅い）"""
+        song = self._columns.song
+        return self.compress(predicate(song(row)) for row in self._rows)
+
+    def unique(self):
+        """同じ楽曲（タイトルとアーティストが同じ）の2回目以降を除いたテーブル"""
+        title_ids = self._columns.title_ids
+        artist_ids = self._columns.artist_ids
+        seen = set()
+        rows = array('I')
+        for row in self._rows:
+            key = (title_ids[row] << 32) | artist_ids[row]
+            if key not in seen:
+                seen.add(key)
+                rows.append(row)
+        return self._view(rows)
@@ -2,15 +2,35 @@
 import os
 import base64
 import json
+import hashlib
 import requests
 from datetime import datetime, timedelta
 from urllib.parse import urlencode, quote
+from concurrent.futures import ThreadPoolExecutor
+from http_transport import get_default_transport
+from request_scheduler import RequestScheduler, PRIORITY_BULK
+from response_cache import ResponseCache
+from batch_fetcher import BatchFetcher
+from playlist_writer import PlaylistWriteEngine, MAX_URIS_PER_REQUEST, format_track_uri
+from track_resolver import TrackResolver
+
+
+class PageFetchError(Exception):
+    """ページ単位の取得（iter_pages）の途中でページを取得できなかった"""
+    
+    def __init__(self, endpoint, offset):
+        super().__init__(f"{endpoint} の offset={offset} のページを取得できませんでした")
+        self.endpoint = endpoint
+        self.offset = offset
 
 
 class SpotifyAuthenticator:
     """Spotify認証を処理するクラス"""
     
-    def __init__(self):
+    def __init__(self, transport=None):
+        # HTTP通信（省略時はアプリ全体で共有するトランスポート）
+        self.transport = transport or get_default_transport()
+        
         # 環境変数またはハードコードされた値
         self.CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID', '1264cdded6274116ad86ae402ca3f7f1')
         self.CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET', 'e48ec1cb727040c29d4b2753347a72ea')
@@ -62,7 +82,7 @@ class SpotifyAuthenticator:
         }
         
         try:
-            response = requests.post(self.TOKEN_URL, headers=headers, data=data)
+            response = self.transport.post(self.TOKEN_URL, headers=headers, data=data)
             response.raise_for_status()
             
             tokens = response.json()
@@ -95,7 +115,7 @@ class SpotifyAuthenticator:
         }
         
         try:
-            response = requests.post(self.TOKEN_URL, headers=headers, data=data)
+            response = self.transport.post(self.TOKEN_URL, headers=headers, data=data)
             response.raise_for_status()
             
             tokens = response.json()
@@ -137,8 +157,20 @@ class SpotifyAuthenticator:
 class SpotifyClient:
     """Spotify Web APIクライアント"""
     
-    def __init__(self, authenticator):
+    def __init__(self, authenticator, transport=None, scheduler=None, response_cache=None, resolution_cache=None):
         self.authenticator = authenticator
+        self.transport = transport or authenticator.transport
+        # レート制限・再送・優先度の管理
+        self.scheduler = scheduler or RequestScheduler()
+        # GETレスポンスのキャッシュ
+        self.response_cache = response_cache or ResponseCache()
+        self._cache_user = None  # (アクセストークンのハッシュ, ユーザーID)
+        # 楽曲名 → URI の解決結果のキャッシュ（TrackResolver が使う、省略可）
+        self.resolution_cache = resolution_cache
+        # ID指定の一括取得
+        self.batch_fetcher = BatchFetcher(self)
+        # プレイリストへの分割書き込み
+        self.playlist_writer = PlaylistWriteEngine(self)
         self.BASE_URL = 'https://api.spotify.com/v1'
     
     def _get_headers(self):
@@ -160,29 +192,89 @@ class SpotifyClient:
         
         url = f"{self.BASE_URL}/{endpoint}"
         
+        # キャッシュ対象のGETは有効期間内ならネットワークを使わない
+        use_cache = kwargs.pop('use_cache', True)
+        cache_key = None
+        cached = None
+        ttl = self.response_cache.ttl_for(endpoint) if method == 'GET' and use_cache else None
+        if ttl is not None:
+            user = self._get_cache_user(endpoint)
+            cache_key = self.response_cache.make_key(endpoint, kwargs.get('params'), user)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                if cached.is_fresh():
+                    return cached.body
+                if cached.etag:
+                    headers['If-None-Match'] = cached.etag
+        
         try:
-            response = requests.request(method, url, headers=headers, **kwargs)
+            response = self.scheduler.execute(
+                lambda: self.transport.request(method, url, headers=headers, **kwargs),
+                method
+            )
+            if response.status_code == 304 and cached is not None:
+                self.response_cache.refresh(cached, ttl)
+                return cached.body
             response.raise_for_status()
-            return response.json()
+            body = response.json()
         except requests.exceptions.RequestException as e:
             print(f"APIリクエストエラー: {e}")
             return None
+        
+        if cache_key is not None:
+            self.response_cache.put(cache_key, endpoint, user, body, response.headers.get('ETag'), ttl)
+        elif method != 'GET':
+            self._invalidate_after_write(endpoint)
+        return body
+    
+    def _get_cache_user(self, endpoint):
+        """キャッシュキーに使うユーザーの識別子を取得"""
+        token_hash = hashlib.sha256((self.authenticator.get_access_token() or '').encode()).hexdigest()[:16]
+        # 'me' 自体はユーザーIDを調べるためのものなのでトークン単位でキャッシュ
+        if endpoint == 'me':
+            return f"token:{token_hash}"
+        if self._cache_user is None or self._cache_user[0] != token_hash:
+            user_info = self.get_current_user()
+            if not user_info or not user_info.get('id'):
+                return f"token:{token_hash}"
+            self._cache_user = (token_hash, user_info['id'])
+        return self._cache_user[1]
+    
+    def _invalidate_after_write(self, endpoint):
+        """書き込み系リクエストの後、影響するキャッシュを削除"""
+        user = self._get_cache_user(endpoint)
+        parts = endpoint.split('/')
+        # users/{id}/playlists, playlists/{id}/tracks などはプレイリスト一覧と対象プレイリストに影響
+        if 'playlists' in parts:
+            self.response_cache.invalidate('me/playlists', user)
+            if parts[0] == 'playlists' and len(parts) > 1:
+                self.response_cache.invalidate(f'playlists/{parts[1]}', user)
+    
+    def invalidate_cache(self):
+        """レスポンスキャッシュをすべて削除"""
+        self.response_cache.clear()
     
     def get_current_user(self):
-        """現在のユーザー情報を取得"""
+        """現在のユーザー情報を取得（ユーザーIDを調べる用途。キャッシュされる）"""
         return self._make_request('GET', 'me')
     
+    def verify_token(self):
+        """アクセストークンがまだ有効か、キャッシュを使わずに確認"""
+        return self._make_request('GET', 'me', use_cache=False) is not None
+    
     def get_current_playing(self):
         """現在再生中の曲情報を取得"""
         return self._make_request('GET', 'me/player/currently-playing')
     
-    def search_tracks(self, query, limit=20):
-        """楽曲を検索"""
+    def search_tracks(self, query, limit=20, offset=0):
+        """楽曲を検索（offset で続きの結果を取得）"""
         params = {
             'q': query,
             'type': 'track',
             'limit': limit
         }
+        if offset:
+            params['offset'] = offset
         return self._make_request('GET', 'search', params=params)
     
     def create_playlist(self, user_id, name, description="", public=True):
@@ -195,7 +287,7 @@ class SpotifyClient:
         return self._make_request('POST', f'users/{user_id}/playlists', json=data)
     
     def add_tracks_to_playlist(self, playlist_id, track_uris):
-        """プレイリストに楽曲を追加"""
+        """プレイリストに楽曲を追加（100曲を超える場合は分割して順番どおりに追加）"""
         if not track_uris:
             return False
         
@@ -203,20 +295,21 @@ class SpotifyClient:
         if isinstance(track_uris, str):
             track_uris = [track_uris]
         
-        # spotify:track: プレフィックスがない場合は追加
-        formatted_uris = []
-        for uri in track_uris:
-            if uri.startswith('spotify:track:'):
-                formatted_uris.append(uri)
-            else:
-                formatted_uris.append(f'spotify:track:{uri}')
+        if len(track_uris) <= MAX_URIS_PER_REQUEST:
+            return self.add_tracks_page(playlist_id, track_uris) is not None
         
+        success, _checkpoint = self.playlist_writer.add_tracks(playlist_id, track_uris)
+        return success
+    
+    def add_tracks_page(self, playlist_id, track_uris, position=None):
+        """最大100曲を1回のリクエストで追加（レスポンスに snapshot_id を含む）"""
         data = {
-            'uris': formatted_uris
+            'uris': [format_track_uri(uri) for uri in track_uris]
         }
+        if position is not None:
+            data['position'] = position
         
-        result = self._make_request('POST', f'playlists/{playlist_id}/tracks', json=data)
-        return result is not None
+        return self._make_request('POST', f'playlists/{playlist_id}/tracks', json=data)
     
     def get_playlist(self, playlist_id):
         """プレイリスト情報を取得"""
@@ -230,8 +323,66 @@ class SpotifyClient:
         }
         return self._make_request('GET', 'me/playlists', params=params)
     
+    def iter_pages(self, endpoint, params=None, page_size=50, items_key='items'):
+        """オフセット方式のページを順に返すジェネレーター
+        
+        現在のページを処理している間に次のページを先読みする。取得済みの
+        ページは保持しないので、件数が多くてもメモリ使用量は一定になる。
+        再試行してもページを取得できなかった場合は PageFetchError を送出する
+        （途中までの結果を全件と取り違えないように）。
+        """
+        params = dict(params or {})
+        priority = self.scheduler.current_priority()
+        
+        def fetch(offset):
+            # 先読みスレッドでも呼び出し元と同じ優先度で送る
+            with self.scheduler.priority(priority):
+                return self._make_request(
+                    'GET', endpoint,
+                    params={**params, 'limit': page_size, 'offset': offset},
+                    use_cache=False
+                )
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            offset = 0
+            future = executor.submit(fetch, offset)
+            while future is not None:
+                page = future.result()
+                if page is None:
+                    raise PageFetchError(endpoint, offset)
+                if not page:
+                    return
+                
+                items = page.get(items_key) or []
+                offset += len(items)
+                total = page.get('total')
+                has_next = bool(items) and (offset < total if total is not None else len(items) == page_size)
+                future = executor.submit(fetch, offset) if has_next else None
+                
+                yield page
+    
+    def iter_items(self, endpoint, params=None, page_size=50, items_key='items'):
+        """全ページの要素を1件ずつ返すジェネレーター"""
+        for page in self.iter_pages(endpoint, params, page_size, items_key):
+            yield from page.get(items_key) or []
+    
+    def iter_playlist_tracks(self, playlist_id, fields=None, page_size=100):
+        """プレイリストの全楽曲を1件ずつ返すジェネレーター
+        
+        fields を指定するとレスポンスを必要な項目に絞れる（例: 'items(track(uri))'）。
+        """
+        params = {}
+        if fields:
+            # ページ送りの判定に total を使う
+            params['fields'] = fields if 'total' in fields else f"{fields},total"
+        return self.iter_items(f'playlists/{playlist_id}/tracks', params, page_size)
+    
+    def iter_user_playlists(self, page_size=50):
+        """ユーザーの全プレイリストを1件ずつ返すジェネレーター"""
+        return self.iter_items('me/playlists', page_size=page_size)
+    
     def remove_tracks_from_playlist(self, playlist_id, track_uris):
-        """プレイリストから楽曲を削除"""
+        """プレイリストから楽曲を削除（100曲を超える場合は分割して削除）"""
         if not track_uris:
             return False
         
@@ -239,38 +390,75 @@ class SpotifyClient:
         if isinstance(track_uris, str):
             track_uris = [track_uris]
         
-        # spotify:track: プレフィックスがない場合は追加
-        formatted_uris = []
-        for uri in track_uris:
-            if uri.startswith('spotify:track:'):
-                formatted_uris.append({'uri': uri})
-            else:
-                formatted_uris.append({'uri': f'spotify:track:{uri}'})
-        
+        success, _snapshot_id = self.playlist_writer.remove_tracks(playlist_id, track_uris)
+        return success
+    
+    def remove_tracks_page(self, playlist_id, track_uris, snapshot_id=None):
+        """最大100曲を1回のリクエストで削除（レスポンスに snapshot_id を含む）"""
         data = {
-            'tracks': formatted_uris
+            'tracks': [{'uri': format_track_uri(uri)} for uri in track_uris]
         }
+        if snapshot_id:
+            data['snapshot_id'] = snapshot_id
         
-        result = self._make_request('DELETE', f'playlists/{playlist_id}/tracks', json=data)
-        return result is not None
+        return self._make_request('DELETE', f'playlists/{playlist_id}/tracks', json=data)
+    
+    def get_playlist_length(self, playlist_id):
+        """プレイリストの現在の曲数を取得（キャッシュを使わない）"""
+        result = self._make_request(
+            'GET', f'playlists/{playlist_id}',
+            params={'fields': 'tracks.total'},
+            use_cache=False
+        )
+        if result is None:
+            return None
+        return result.get('tracks', {}).get('total')
     
     def get_track_by_id(self, track_id):
         """トラックIDから楽曲情報を取得"""
         return self._make_request('GET', f'tracks/{track_id}')
     
     def get_tracks_by_ids(self, track_ids):
-        """複数のトラックIDから楽曲情報を取得"""
+        """複数のトラックIDから楽曲情報を取得（入力順、取得できなかったものはNone）"""
+        if not track_ids:
+            return None
+        
+        result = self.get_tracks_batch(track_ids)
+        if not result.items:
+            return None
+        return {'tracks': result.ordered()}
+    
+    def get_tracks_batch(self, track_ids):
+        """任意件数のトラックを50件ずつ並列に取得（BatchResult を返す）"""
+        return self.batch_fetcher.fetch('tracks', track_ids, 'tracks', page_size=50)
+    
+    def get_audio_features_by_ids(self, track_ids):
+        """複数のトラックの音楽特徴量を取得（入力順、取得できなかったものはNone）"""
         if not track_ids:
             return None
         
-        # 最大50件まで一度に取得可能
-        if len(track_ids) > 50:
-            track_ids = track_ids[:50]
+        result = self.get_audio_features_batch(track_ids)
+        if not result.items:
+            return None
+        return {'audio_features': result.ordered()}
+    
+    def get_audio_features_batch(self, track_ids):
+        """任意件数のトラックの音楽特徴量を100件ずつ並列に取得（BatchResult を返す）"""
+        return self.batch_fetcher.fetch('audio-features', track_ids, 'audio_features', page_size=100)
+    
+    def get_artists_by_ids(self, artist_ids):
+        """複数のアーティスト情報を取得（入力順、取得できなかったものはNone）"""
+        if not artist_ids:
+            return None
         
-        params = {
-            'ids': ','.join(track_ids)
-        }
-        return self._make_request('GET', 'tracks', params=params)
+        result = self.get_artists_batch(artist_ids)
+        if not result.items:
+            return None
+        return {'artists': result.ordered()}
+    
+    def get_artists_batch(self, artist_ids):
+        """任意件数のアーティストを50件ずつ並列に取得（BatchResult を返す）"""
+        return self.batch_fetcher.fetch('artists', artist_ids, 'artists', page_size=50)
     
     def get_user_top_tracks(self, limit=20, time_range='medium_term'):
         """ユーザーのトップトラックを取得"""
@@ -313,6 +501,14 @@ class SpotifyClient:
         """利用可能なジャンルシードを取得"""
         return self._make_request('GET', 'recommendations/available-genre-seeds')
     
+    def bulk_priority(self):
+        """まとめ処理用の低い優先度でリクエストを送るコンテキスト"""
+        return self.scheduler.priority(PRIORITY_BULK)
+    
+    def get_request_stats(self):
+        """リクエストキューの深さと制限状況を取得"""
+        return self.scheduler.stats()
+    
     def refresh_token(self):
         """トークンを手動で更新"""
         return self.authenticator.refresh_access_token()
@@ -331,87 +527,95 @@ class SpotifyPlaylistManager:
     
     def create_playlist_from_songs(self, playlist_name, songs, description="", public=False):
         """楽曲リストからプレイリストを作成"""
-        if not self.client.is_authenticated():
-            return False, "認証が必要です"
-        
-        # ユーザー情報を取得
-        user_info = self.client.get_current_user()
-        if not user_info:
-            return False, "ユーザー情報の取得に失敗しました"
-        
-        # プレイリストを作成
-        playlist_info = self.client.create_playlist(
-            user_info['id'], 
-            playlist_name, 
-            description, 
-            public
-        )
-        
-        if not playlist_info:
-            return False, "プレイリストの作成に失敗しました"
-        
-        # 楽曲を検索してURIを取得
-        track_uris = []
-        failed_tracks = []
-        
-        for song in songs:
-            # 楽曲名とアーティスト名で検索
-            search_query = f"{song.title} {song.artist}"
-            search_results = self.client.search_tracks(search_query, limit=1)
-            
-            if search_results and search_results.get('tracks', {}).get('items'):
-                track = search_results['tracks']['items'][0]
-                track_uris.append(track['uri'])
-            else:
-                failed_tracks.append(str(song))
-        
-        # 見つかった楽曲をプレイリストに追加
-        if track_uris:
-            success = self.client.add_tracks_to_playlist(playlist_info['id'], track_uris)
-            if success:
-                return True, f"プレイリスト '{playlist_name}' を作成しました。{len(track_uris)}曲を追加しました。"
+        # まとめ処理なので対話的なリクエストより後回しにする
+        with self.client.bulk_priority():
+            if not self.client.is_authenticated():
+                return False, "認証が必要です"
+        
+            # ユーザー情報を取得
+            user_info = self.client.get_current_user()
+            if not user_info:
+                return False, "ユーザー情報の取得に失敗しました"
+        
+            # プレイリストを作成
+            playlist_info = self.client.create_playlist(
+                user_info['id'], 
+                playlist_name, 
+                description, 
+                public
+            )
+        
+            if not playlist_info:
+                return False, "プレイリストの作成に失敗しました"
+        
+            # URIが分かっている楽曲はそのまま使い、それ以外は楽曲名とアーティスト名で検索
+            track_uris = []
+            failed_tracks = []
+        
+            for resolution in TrackResolver(self.client).resolve_in_order(songs):
+                if resolution.uri:
+                    track_uris.append(resolution.uri)
+                else:
+                    failed_tracks.append(str(resolution.song))
+        
+            # 見つかった楽曲をプレイリストに追加
+            if track_uris:
+                success = self.client.add_tracks_to_playlist(playlist_info['id'], track_uris)
+                if success:
+                    return True, f"プレイリスト '{playlist_name}' を作成しました。{len(track_uris)}曲を追加しました。"
+                else:
+                    return False, "楽曲の追加に失敗しました"
             else:
-                return False, "楽曲の追加に失敗しました"
-        else:
-            return False, "追加できる楽曲が見つかりませんでした"
+                return False, "追加できる楽曲が見つかりませんでした"
     
     def get_playlist_tracks(self, playlist_id):
-        """プレイリストの楽曲を取得"""
-        playlist = self.client.get_playlist(playlist_id)
-        if playlist and 'tracks' in playlist:
-            return playlist['tracks']['items']
-        return []
+        """プレイリストの楽曲を取得（全ページ）"""
+        try:
+            return list(self.client.iter_playlist_tracks(playlist_id))
+        except PageFetchError as e:
+            print(f"プレイリストの楽曲取得エラー: {e}")
+            return []
     
     def duplicate_playlist(self, source_playlist_id, new_name):
         """プレイリストを複製"""
-        # 元のプレイリストの楽曲を取得
-        tracks = self.get_playlist_tracks(source_playlist_id)
-        track_uris = [track['track']['uri'] for track in tracks if track['track']]
-        
-        # ユーザー情報を取得
-        user_info = self.client.get_current_user()
-        if not user_info:
-            return False, "ユーザー情報の取得に失敗しました"
-        
-        # 新しいプレイリストを作成
-        new_playlist = self.client.create_playlist(
-            user_info['id'], 
-            new_name, 
-            f"複製元: {source_playlist_id}"
-        )
-        
-        if not new_playlist:
-            return False, "プレイリストの作成に失敗しました"
-        
-        # 楽曲を追加
-        if track_uris:
-            success = self.client.add_tracks_to_playlist(new_playlist['id'], track_uris)
-            if success:
-                return True, f"プレイリスト '{new_name}' を作成しました。{len(track_uris)}曲を複製しました。"
-            else:
+        # まとめ処理なので対話的なリクエストより後回しにする
+        with self.client.bulk_priority():
+            # ユーザー情報を取得
+            user_info = self.client.get_current_user()
+            if not user_info:
+                return False, "ユーザー情報の取得に失敗しました"
+        
+            # 新しいプレイリストを作成
+            new_playlist = self.client.create_playlist(
+                user_info['id'], 
+                new_name, 
+                f"複製元: {source_playlist_id}"
+            )
+        
+            if not new_playlist:
+                return False, "プレイリストの作成に失敗しました"
+        
+            # 元のプレイリストを1ページずつ読みながら、100曲ずつ順番どおりに書き込む
+            session = self.client.playlist_writer.open_session(new_playlist['id'], base_position=0)
+            tracks = self.client.iter_playlist_tracks(source_playlist_id, fields='items(track(uri))')
+            try:
+                for item in tracks:
+                    track = item.get('track')
+                    if track and track.get('uri') and not session.append(track['uri']):
+                        return False, "楽曲の複製に失敗しました"
+            except PageFetchError as e:
+                # 読めたところまでは書き込み、途中で止まったことを報告する
+                print(f"複製元の楽曲取得エラー: {e}")
+                session.flush()
+                return False, (f"複製元の楽曲を最後まで取得できませんでした。"
+                               f"'{new_name}' には{session.checkpoint.written_count}曲だけ複製されています。")
+            if not session.flush():
                 return False, "楽曲の複製に失敗しました"
         
-        return True, f"空のプレイリスト '{new_name}' を作成しました。"
+            copied_count = session.checkpoint.written_count
+            if copied_count:
+                return True, f"プレイリスト '{new_name}' を作成しました。{copied_count}曲を複製しました。"
+            return True, f"空のプレイリスト '{new_name}' を作成しました。"
 
 
 # 設定ファイルの例
@@ -0,0 +1,159 @@
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from resolution_cache import resolution_key
+
+
+# SpotifyのトラックURI（IDは22文字のBase62）
+TRACK_URI_PATTERN = re.compile(r'^spotify:track:[0-9A-Za-z]{22}$')
+
+
+def known_track_uri(song):
+    """Songが正しい形式のSpotify URIを持っていれば返す（なければNone）"""
+    if isinstance(song, str):
+        return None
+    uri = getattr(song, 'spotify_uri', None)
+    if uri and TRACK_URI_PATTERN.match(uri):
+        return uri
+    spotify_id = getattr(song, 'spotify_id', None)
+    if spotify_id and TRACK_URI_PATTERN.match(f'spotify:track:{spotify_id}'):
+        return f'spotify:track:{spotify_id}'
+    return None
+
+
+def song_title_artist(song):
+    """楽曲の (タイトル, アーティスト) を取得（文字列は "タイトル - アーティスト" として分割）"""
+    if isinstance(song, str):
+        title, _sep, artist = song.partition(' - ')
+        return title, artist
+    return song.title, song.artist
+
+
+def search_query_for(song):
+    """検索クエリを作成（Songならタイトルとアーティスト、文字列ならそのまま）"""
+    if isinstance(song, str):
+        return song
+    return f"{song.title} {song.artist}"
+
+
+class TrackResolution:
+    """楽曲1件分の解決結果"""
+
+    def __init__(self, song, track=None, error=None, searched=True):
+        self.song = song          # 入力（Song または "タイトル - アーティスト" の文字列）
+        self.track = track        # 見つかったトラック（なければNone）
+        self.error = error
+        self.searched = searched  # 検索APIを使ったかどうか
+
+    @property
+    def uri(self):
+        return self.track.get('uri') if self.track else None
+
+
+class TrackResolver:
+    """楽曲をSpotifyのトラックに並列で解決するクラス
+
+    Song が spotify_uri / spotify_id を持っていればそれをそのまま使い、
+    持っていない楽曲は解決キャッシュを引き、なければ検索する。検索は上限付きの
+    ワーカープールで行い、レート制限は SpotifyClient のスケジューラーに任せる。結果は入力順に
+    返すので、進捗表示や書き込みの順序は逐次処理のときと変わらない。
+    """
+
+    def __init__(self, client, max_workers=4, cache=None):
+        self.client = client
+        self.max_workers = max_workers
+        # 解決結果のキャッシュ（省略時はクライアントに設定されたもの）
+        self.cache = cache if cache is not None else getattr(client, 'resolution_cache', None)
+
+    def resolve_one(self, song):
+        """1曲を解決（URIが分かっている Song は検索しない）"""
+        uri = known_track_uri(song)
+        if uri:
+            track = {'uri': uri, 'name': song.title, 'artists': [{'name': song.artist}]}
+            return TrackResolution(song, track=track, searched=False)
+
+        # キャッシュにあれば検索しない（見つからなかった結果も含む）
+        title, artist = song_title_artist(song)
+        if self.cache is not None:
+            hit, track = self.cache.lookup(title, artist)
+            if hit:
+                return TrackResolution(song, track=track, searched=False)
+
+        try:
+            search_results = self.client.search_tracks(search_query_for(song), limit=1)
+        except Exception as e:
+            return TrackResolution(song, error=str(e))
+        if search_results is None:
+            return TrackResolution(song, error="検索に失敗しました")
+
+        items = search_results.get('tracks', {}).get('items')
+        track = items[0] if items else None
+        if self.cache is not None:
+            self.cache.store(title, artist, track)
+        return TrackResolution(song, track=track)
+
+    def warm_up(self, songs):
+        """まだ解決していない楽曲をまとめて解決し、キャッシュに保存する
+
+        URIが分かっている楽曲や有効なキャッシュがある楽曲は検索しない。
+        """
+        pending = []
+        seen_keys = set()
+        cached_count = 0
+        for song in songs:
+            if known_track_uri(song):
+                continue
+            title, artist = song_title_artist(song)
+            key = resolution_key(title, artist)
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            if self.cache is not None and self.cache.is_fresh(title, artist):
+                cached_count += 1
+            else:
+                pending.append(song)
+
+        stats = {'cached': cached_count, 'resolved': 0, 'not_found': 0, 'failed': 0}
+        for resolution in self.resolve_in_order(pending):
+            if resolution.error:
+                stats['failed'] += 1
+            elif resolution.uri:
+                stats['resolved'] += 1
+            else:
+                stats['not_found'] += 1
+        return stats
+
+    def resolve_in_order(self, songs):
+        """楽曲を並列に解決し、入力順に TrackResolution を返すジェネレーター
+
+        先行して解決するのは最大 max_workers * 4 件までなので、呼び出し側が
+        結果を処理（書き込みなど）している間も検索が進み、メモリも増え続けない。
+        ジェネレーターを途中で閉じると、未着手の検索は実行されない。
+        """
+        priority = self.client.scheduler.current_priority()
+
+        def resolve(song):
+            # ワーカーからも呼び出し元と同じ優先度で送る
+            with self.client.scheduler.priority(priority):
+                return self.resolve_one(song)
+
+        window = self.max_workers * 4
+        songs = iter(songs)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for song in songs:
+                pending.append(executor.submit(resolve, song))
+                if len(pending) >= window:
+                    break
+
+            try:
+                while pending:
+                    resolution = pending.popleft().result()
+                    next_song = next(songs, None)
+                    if next_song is not None:
+                        pending.append(executor.submit(resolve, next_song))
+                    yield resolution
+            finally:
+                # 途中で打ち切られた（キャンセルなど）ときは、まだ始まっていない検索を取り消す
+                for future in pending:
+                    future.cancel()